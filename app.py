@@ -1,6 +1,10 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from flask import Flask, render_template, jsonify, request, send_file
 from flask_cors import CORS
 import os
@@ -16,6 +20,14 @@ from src.background_processor import BackgroundProcessor
 from src.customization_service import CustomizationService
 from datetime import datetime
 
+# Set up logging: records are handed to a listener thread, so processing
+# threads never block on the console while writing them out
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, logging.StreamHandler())
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(_log_queue)])
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
 app = Flask(__name__)
 CORS(app)
 
@@ -26,6 +38,8 @@ resume_parser = ResumeParser()
 customization_service = CustomizationService()
 candidate_service = CandidateService(llm_service, resume_parser, customization_service)
 background_processor = BackgroundProcessor(candidate_service, resume_parser, llm_service)
+# Release the LLM client's pooled connections on shutdown
+atexit.register(llm_service.close)
 
 print("🚀 Resume processing with real-time updates and smart retry logic enabled")
 
@@ -287,16 +301,10 @@ def job_description():
             
         result = customization_service.update_settings(job_description)
         
-        # Clear cache to force re-analysis with new job description
-        if os.path.exists(candidate_service.summaries_cache):
-            os.remove(candidate_service.summaries_cache)
-            
-        # Clear in-memory summaries cache
-        candidate_service.summaries = {}
-        candidate_service._load_data()  # Reload empty data from disk
-            
-        # Start processing resumes with the new job description
-        background_processor.start_background_processing()
+        # Existing summaries keep being served (flagged stale) while the background
+        # processor re-analyzes them against the new job description. A run already
+        # in progress took its settings snapshot at start, so restart it.
+        background_processor.restart_processing()
         
         return jsonify(result)
     else:
@@ -535,9 +543,9 @@ def debug_processing_state():
         processed_ids = set(candidate_service.summaries.keys())
         
         # Get decided candidates (saved, passed, starred)
-        saved_ids = {item['id'] for item in candidate_service.decisions['saved']}
-        passed_ids = {item['id'] for item in candidate_service.decisions['passed']}
-        starred_ids = {item['id'] for item in candidate_service.decisions.get('starred', [])}
+        saved_ids = candidate_service.decisions['saved'].keys()
+        passed_ids = candidate_service.decisions['passed'].keys()
+        starred_ids = candidate_service.decisions['starred'].keys()
         decided_ids = saved_ids | passed_ids | starred_ids
         
         # Get retry queue IDs
@@ -0,0 +1,87 @@
+import os
+import json
+import copy
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
+logger = logging.getLogger(__name__)
+
+class AnalysisCache:
+    """LRU cache of LLM analyses keyed on resume text + job description, persisted to disk"""
+
+    def __init__(self, data_folder='data', max_entries=500):
+        self.data_folder = data_folder
+        self.cache_file = os.path.join(self.data_folder, 'analysis_cache.json')
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()   # Serializes writers so an older snapshot never lands last
+        self.dirty = False
+        self.entries = self._load_entries()
+
+    def _load_entries(self):
+        """Load cached analyses from disk"""
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'rb') as f:
+                    return OrderedDict(_json_loads(f.read()))
+            except (OSError, ValueError) as e:
+                logger.warning("Failed to load analysis cache: %s", e)
+        return OrderedDict()
+
+    def save(self):
+        """Write the cache to disk if anything changed since the last save"""
+        with self.save_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                snapshot = dict(self.entries)
+                self.dirty = False
+
+            # Write then rename, so a process killed mid-save keeps the previous checkpoint
+            os.makedirs(self.data_folder, exist_ok=True)
+            tmp_file = self.cache_file + '.tmp'
+            with open(tmp_file, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_file, self.cache_file)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Collapse whitespace so re-exports of the same document (PDF vs DOCX, re-flowed lines) share a key"""
+        return ' '.join(text.split())
+
+    @classmethod
+    def make_key(cls, resume_text: str, job_description: str) -> str:
+        """Content hash identifying one (resume, job description) pair"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(cls.normalize(resume_text).encode('utf-8', 'surrogatepass'))
+        digest.update(b'\x00')
+        digest.update(cls.normalize(job_description).encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def get(self, resume_text: str, job_description: str) -> Optional[Dict]:
+        """Return a copy of the cached analysis, or None on a miss"""
+        key = self.make_key(resume_text, job_description)
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                return None
+            self.entries.move_to_end(key)
+        return copy.deepcopy(result)
+
+    def put(self, resume_text: str, job_description: str, result: Dict):
+        """Store an analysis, evicting the least recently used entries past max_entries"""
+        key = self.make_key(resume_text, job_description)
+        with self.lock:
+            self.entries[key] = copy.deepcopy(result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.dirty = True
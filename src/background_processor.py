@@ -2,27 +2,58 @@ import threading
 import time
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
-from .batch_processor import BatchProcessor
+from .batch_processor import BatchProcessor, BatchTimeoutError, RESULT_MAX_TOKENS, is_valid_analysis
+from .openai_adapter import is_reasoning_model
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Failure classification vocabulary (validity itself is batch_processor.is_valid_analysis)
+FORMATTING_INDICATORS = (
+    'formatting issue',
+    'format was invalid',
+    'json parsing failed',
+    'response format',
+    'quality issues'
+)
+
+class AtomicCounter:
+    """Integer counter that can be updated safely from several threads"""
+    def __init__(self, value=0):
+        self._value = value
+        self._lock = threading.Lock()
+    
+    @property
+    def value(self):
+        return self._value
+    
+    def set(self, value):
+        with self._lock:
+            self._value = value
+    
+    def increment(self, amount=1):
+        with self._lock:
+            self._value += amount
+            return self._value
+
 class BackgroundProcessor:
     def __init__(self, candidate_service, resume_parser, llm_service):
         self.candidate_service = candidate_service
         self.resume_parser = resume_parser
         self.llm_service = llm_service
-        self.batch_processor = BatchProcessor(llm_service)
         
         # Processing state
         self.processing_thread = None
-        self.is_processing = False
-        self.processed_count = 0
-        self.total_count = 0
+        self._processing = threading.Event()   # Set while the current run should continue; each run gets its own
+        self._cancel = threading.Event()       # Set when the current run is stopped, to abort a bulk job it waits on
+        self._run_lock = threading.Lock()      # Guards the two flags below
+        self._thread_running = False           # A processing thread hasn't exited yet (it may be stopping)
+        self._restart_pending = False          # Start a new run as soon as that thread exits
+        self.processed_count = AtomicCounter()
+        self.total_count = AtomicCounter()
         self.status = "idle"
         
         # Retry state persistence
@@ -47,18 +78,32 @@ class BackgroundProcessor:
             'long_timeout': 180,        # 3 minutes for reasoning models
             'max_retries': 3,           # Maximum retry attempts
             'backoff_base': 2,          # Exponential backoff base
-            'batch_size': 1,            # Candidates per batch (configurable)
+            'batch_size': 1,            # Candidates per batch (configurable; 0 = tuned from observed latency)
+            'parallel_batches': 4,      # Batches sent to the LLM at the same time
             'real_time_interval': 2,    # Seconds between real-time updates
+            'offline_batch_threshold': None,  # Runs with at least this many resumes use the bulk API
         }
         
         # Load configuration and retry state
         self._load_config()
         self._load_retry_state()
         
+        self.batch_processor = BatchProcessor(
+            llm_service,
+            max_in_flight=int(os.getenv('RESUME_MAX_IN_FLIGHT', 50)),
+            rate_limit_rpm=int(os.getenv('RESUME_RATE_LIMIT_RPM', 0)) or None,
+            json_mode=bool(int(os.getenv('RESUME_JSON_MODE', 0))),
+            max_output_tokens=self.config['max_output_tokens']
+        )
+        
         # Real-time processing tracking
         self.newly_processed = []   # Candidates processed since last UI update
         self.processing_lock = threading.Lock()
     
+    @property
+    def is_processing(self):
+        return self._processing.is_set()
+    
     def _load_retry_state(self):
         """Load retry queues and tracking data from disk"""
         try:
@@ -129,25 +174,35 @@ class BackgroundProcessor:
         self.config['quick_timeout'] = int(os.getenv('RESUME_QUICK_TIMEOUT', self.config['quick_timeout']))
         self.config['long_timeout'] = int(os.getenv('RESUME_LONG_TIMEOUT', self.config['long_timeout']))
         self.config['max_retries'] = int(os.getenv('RESUME_MAX_RETRIES', self.config['max_retries']))
+        self.config['offline_batch_threshold'] = int(os.getenv('RESUME_OFFLINE_BATCH_THRESHOLD', 0)) or None
         
         # Check for model-specific timeout settings
         model_name = os.getenv('OPENAI_DEFAULT_MODEL', 'gpt-4o').lower()
         
-        if 'o3' in model_name or 'reasoning' in model_name:
+        reasoning = is_reasoning_model(model_name)
+        if reasoning:
             self.config['default_timeout'] = self.config['long_timeout']
             logger.info(f"Detected reasoning model {model_name}, using long timeout: {self.config['long_timeout']}s")
         else:
             self.config['default_timeout'] = self.config['quick_timeout']
             logger.info(f"Using standard model {model_name}, using quick timeout: {self.config['quick_timeout']}s")
         
+        # Reasoning models spend part of the output budget thinking, so they get no cap unless one is set
+        default_max_output = 0 if reasoning else RESULT_MAX_TOKENS
+        self.config['max_output_tokens'] = int(os.getenv('RESUME_MAX_OUTPUT_TOKENS', default_max_output)) or None
+        
         # Batch processing configuration
-        self.config['batch_size'] = int(os.getenv('RESUME_BATCH_SIZE', self.config['batch_size']))
+        self.config['batch_size'] = max(0, int(os.getenv('RESUME_BATCH_SIZE', self.config['batch_size'])))
+        self.config['parallel_batches'] = max(1, int(os.getenv('RESUME_PARALLEL_BATCHES', self.config['parallel_batches'])))
         
         # Log the configuration
-        if self.config['batch_size'] > 1:
+        if self.config['batch_size'] == 0:
+            logger.info("Adaptive batch size: resumes per request tuned from observed latency")
+        elif self.config['batch_size'] > 1:
             logger.info(f"Batch processing enabled: {self.config['batch_size']} resumes per batch")
         else:
-            logger.info("Processing one resume at a time")
+            logger.info("Processing one resume per request")
+        logger.info(f"Up to {self.config['parallel_batches']} batches in flight at once")
         
     def start_background_processing(self):
         """Start processing resumes in the background with real-time updates"""
@@ -166,9 +221,24 @@ class BackgroundProcessor:
             self.status = "completed"
             return
             
-        self.processing_thread = threading.Thread(target=self._process_all_resumes_enhanced)
+        with self._run_lock:
+            if self._thread_running:
+                # A stopped run is still inside an LLM call; it starts its successor when it
+                # exits, so two runs never process (and write summaries) side by side
+                self._restart_pending = True
+                logger.info("Background processing start queued until the current batch finishes")
+                return
+            self._thread_running = True
+        
+        # A fresh event per run: a stopped run that is still finishing an LLM call
+        # can't be revived by, or cut short, the run that replaces it
+        run = threading.Event()
+        run.set()
+        cancel = threading.Event()
+        self._processing = run
+        self._cancel = cancel
+        self.processing_thread = threading.Thread(target=self._process_all_resumes_enhanced, args=(run, cancel))
         self.processing_thread.daemon = True
-        self.is_processing = True
         self.status = "processing"
         
         # Clear previous state
@@ -178,10 +248,11 @@ class BackgroundProcessor:
         self.processing_thread.start()
         logger.info("Background processing thread started")
         
-    def _process_all_resumes_enhanced(self):
-        """Enhanced processing with real-time updates and smart retry logic"""
+    def _process_all_resumes_enhanced(self, run: threading.Event, cancel: threading.Event):
+        """Enhanced processing with real-time updates and smart retry logic; stops once run is
+        cleared, and abandons a pending bulk job once cancel is set"""
         try:
-            customization_settings = self.candidate_service.customization_service.get_settings()
+            customization_settings = dict(self.candidate_service.customization_service.get_settings())
             
             # Get all resumes first for debugging
             all_resumes = self.resume_parser.get_all_resumes(self.candidate_service.candidates_folder)
@@ -208,43 +279,67 @@ class BackgroundProcessor:
                         logger.warning("No unprocessed resumes found, but not all resumes are processed. This might be a bug.")
                         self.status = "completed"
                     
-                    self.is_processing = False
+                    run.clear()
                     return
                 unprocessed_resumes = retry_candidates
             
-            self.total_count = len(unprocessed_resumes)
-            self.processed_count = 0
+            self.total_count.set(len(unprocessed_resumes))
+            self.processed_count.set(0)
             
-            # Process resumes with real-time updates
-            batch_size = self.config['batch_size']
-            
-            for i in range(0, len(unprocessed_resumes), batch_size):
-                if not self.is_processing:
-                    break
-                    
-                batch = unprocessed_resumes[i:i + batch_size]
-                logger.info(f"Processing batch {i//batch_size + 1}: {[r['name'] for r in batch]}")
-                
-                # Process batch with enhanced error handling
-                self._process_batch_enhanced(batch, customization_settings)
-                
-                # Save progress and update UI
-                self.candidate_service._save_data()
+            threshold = self.config['offline_batch_threshold']
+            offline = bool(threshold) and len(unprocessed_resumes) >= threshold
+            if offline:
+                # Large runs go to the bulk API as a single job: half price, but slow to return
+                logger.info(f"{len(unprocessed_resumes)} resumes meet the offline threshold of {threshold}; using the bulk API")
+                batches = [unprocessed_resumes]
+            else:
+                # Process resumes with real-time updates; each group holds several batches
+                # so their LLM round-trips overlap instead of running one after another
+                group_size = self._batch_size() * self.config['parallel_batches']
+                batches = [unprocessed_resumes[i:i + group_size] for i in range(0, len(unprocessed_resumes), group_size)]
+            
+            # Read the next batch's files while the current batch waits on the LLM
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix='resume-reader') as reader:
+                next_texts = reader.submit(self._read_resume_texts, batches[0])
                 
-                # Small delay between batches
-                time.sleep(0.5)
+                for index, batch in enumerate(batches):
+                    if not run.is_set():
+                        break
+                    
+                    texts = next_texts.result()
+                    if index + 1 < len(batches):
+                        next_texts = reader.submit(self._read_resume_texts, batches[index + 1])
+                    
+                    logger.info(f"Processing batch {index + 1}: {[r['name'] for r in batch]}")
+                    
+                    # Process batch with enhanced error handling
+                    self._process_batch_enhanced(batch, customization_settings, texts, cancel if offline else None)
+                    
+                    # Save progress and update UI
+                    self.candidate_service._save_summaries()
+                    
+                    # Small delay between batches
+                    time.sleep(0.5)
             
             # Process any remaining retries
-            self._process_retry_queues(customization_settings)
+            self._process_retry_queues(customization_settings, run)
+            self.candidate_service._save_summaries()
             
-            self.status = "completed"
-            logger.info(f"Background processing completed. Processed {self.processed_count} out of {self.total_count} resumes successfully.")
+            if run is self._processing:
+                self.status = "completed"
+            logger.info(f"Background processing completed. Processed {self.processed_count.value} out of {self.total_count.value} resumes successfully.")
             
         except Exception as e:
             logger.error(f"Enhanced background processing error: {e}")
-            self.status = "error"
+            if run is self._processing:
+                self.status = "error"
         finally:
-            self.is_processing = False
+            run.clear()
+            with self._run_lock:
+                self._thread_running = False
+                restart, self._restart_pending = self._restart_pending, False
+            if restart:
+                self.start_background_processing()
     
     def _get_unprocessed_resumes(self):
         """Get resumes that haven't been processed yet"""
@@ -257,8 +352,8 @@ class BackgroundProcessor:
         for resume in resumes:
             resume_id = resume['id']
             
-            # Check if already processed
-            if resume_id in self.candidate_service.summaries:
+            # Check if already processed; stale summaries keep being served until re-analyzed
+            if resume_id in self.candidate_service.summaries and not self.candidate_service.is_summary_stale(resume_id):
                 logger.debug(f"Resume {resume['filename']} already processed")
                 continue
                 
@@ -332,15 +427,30 @@ class BackgroundProcessor:
         
         return ready_quick + ready_long + ready_format
     
-    def _process_batch_enhanced(self, batch, customization_settings):
-        """Process a batch with enhanced error handling and real-time updates"""
+    def _read_resume_texts(self, batch):
+        """Extract each resume's text, keeping the exception in its place if reading fails"""
+        texts = []
+        for resume in batch:
+            try:
+                texts.append(self.resume_parser.parse_resume(resume['path']))
+            except Exception as e:
+                texts.append(e)
+        return texts
+    
+    def _process_batch_enhanced(self, batch, customization_settings, texts=None, offline_cancel=None):
+        """Process a batch with enhanced error handling and real-time updates; with offline_cancel,
+        the batch goes to the bulk API as one job that setting offline_cancel abandons"""
+        if texts is None:
+            texts = self._read_resume_texts(batch)
+        
         # Prepare resume data
         resumes_data = []
         failed_to_read = []
         
-        for resume in batch:
+        for resume, resume_text in zip(batch, texts):
             try:
-                resume_text = self.resume_parser.parse_resume(resume['path'])
+                if isinstance(resume_text, Exception):
+                    raise resume_text
                 resumes_data.append({
                     'id': resume['id'],
                     'name': resume['name'],
@@ -363,15 +473,34 @@ class BackgroundProcessor:
         # Process with timeout based on model type
         timeout = self._get_timeout_for_batch(resumes_data)
         
+        # Summaries are tagged with the job description they were written for
+        job_hash = self.candidate_service.customization_service.hash_job_description(
+            customization_settings.get('job_description', '')
+        )
+        
         try:
-            # Process the batch with timeout
-            results = self._process_with_timeout(resumes_data, customization_settings, timeout)
+            if offline_cancel is not None:
+                results = self.batch_processor.process_batch_offline(resumes_data, customization_settings, offline_cancel)
+                timed_out_ids = []
+            else:
+                # Process the batch with timeout
+                results, timed_out_ids = self._process_with_timeout(resumes_data, customization_settings, timeout)
+            
+            # Results for a job description that has since changed are dropped, so a run
+            # still finishing after a restart can't overwrite fresher summaries
+            is_current = job_hash == self.candidate_service.customization_service.get_job_hash()
             
             # Handle successful results
             for candidate_id, summary in results.items():
-                if self._is_valid_summary(summary):
+                lowered = self._lowercase_text_fields(summary)
+                if not is_current:
+                    self.retry_queues['processing'] = [
+                        r for r in self.retry_queues['processing'] if r['id'] != candidate_id
+                    ]
+                elif self._is_valid_summary(summary, lowered):
+                    summary['job_hash'] = job_hash
                     self.candidate_service.summaries[candidate_id] = summary
-                    self.processed_count += 1
+                    self.processed_count.increment()
                     
                     # Add to real-time updates
                     with self.processing_lock:
@@ -385,7 +514,7 @@ class BackgroundProcessor:
                     logger.info(f"✅ {candidate_id}: Successfully processed")
                 else:
                     # Invalid result - detect failure type
-                    failure_type = self._detect_failure_type(summary)
+                    failure_type = self._detect_failure_type(summary, lowered)
                     resume = next(r for r in batch if r['id'] == candidate_id)
                     
                     if failure_type == 'formatting_failure':
@@ -395,6 +524,18 @@ class BackgroundProcessor:
                     
                     self._handle_processing_error(resume, f"Invalid summary structure: {failure_type}", failure_type)
             
+            # Only the resumes whose own request timed out wait for the long retry
+            for resume in batch:
+                if resume['id'] in timed_out_ids:
+                    self._handle_processing_error(resume, TimeoutError(f"Processing exceeded {timeout} seconds"), 'timeout')
+            
+            # Resumes a cancelled bulk job never answered are left for the next run
+            unanswered = {r['id'] for r in batch} - set(results) - set(timed_out_ids)
+            if unanswered:
+                self.retry_queues['processing'] = [
+                    r for r in self.retry_queues['processing'] if r['id'] not in unanswered
+                ]
+            
             # Save retry state after processing batch (candidates were removed from processing queue)
             self._save_retry_state()
             
@@ -415,7 +556,8 @@ class BackgroundProcessor:
     def _get_timeout_for_batch(self, resumes_data):
         """Determine appropriate timeout based on batch size and model"""
         base_timeout = self.config['default_timeout']
-        batch_size = len(resumes_data)
+        # The timeout applies to each LLM request, which carries at most one configured batch
+        batch_size = min(len(resumes_data), self._batch_size())
         
         # Adjust timeout based on batch size
         if batch_size == 1:
@@ -427,7 +569,7 @@ class BackgroundProcessor:
         
         # Adjust timeout based on resume length
         total_length = sum(len(r['text']) for r in resumes_data)
-        avg_length = total_length / batch_size if batch_size > 0 else 0
+        avg_length = total_length / len(resumes_data) if resumes_data else 0
         
         # Increase timeout for longer resumes
         if avg_length > 10000:  # Very long resumes
@@ -437,80 +579,39 @@ class BackgroundProcessor:
         
         return int(timeout)
     
+    def _batch_size(self):
+        """Resumes per LLM request: the configured size, or the latency controller's current pick"""
+        return self.config['batch_size'] or self.batch_processor.batch_sizer.current
+    
     def _process_with_timeout(self, resumes_data, customization_settings, timeout):
-        """Process batch with specified timeout using threading approach"""
-        import threading
-        import queue
-        
-        result_queue = queue.Queue()
-        exception_queue = queue.Queue()
-        
-        def worker():
-            try:
-                results = self.batch_processor.process_batch(
-                    resumes_data, customization_settings, len(resumes_data)
-                )
-                result_queue.put(results)
-            except Exception as e:
-                exception_queue.put(e)
-        
-        # Start the worker thread
-        worker_thread = threading.Thread(target=worker)
-        worker_thread.daemon = True
-        worker_thread.start()
-        
-        # Wait for completion or timeout
-        worker_thread.join(timeout=timeout)
-        
-        if worker_thread.is_alive():
-            # Timeout occurred - the worker thread will continue running in background
-            # but we'll move on and treat this as a timeout error
+        """Process batch with the timeout enforced on each LLM request; returns (results, timed-out ids)"""
+        try:
+            # None lets the batch processor size each chunk adaptively
+            results = self.batch_processor.process_batch(
+                resumes_data, customization_settings, self.config['batch_size'] or None, timeout=timeout
+            )
+            return results, []
+        except BatchTimeoutError as e:
+            logger.warning(f"{len(e.timed_out_ids)} of {len(resumes_data)} resumes timed out after {timeout} seconds")
+            return e.results, e.timed_out_ids
+        except TimeoutError:
+            # The client aborted the HTTP request, so nothing is left running
             logger.warning(f"Processing timed out after {timeout} seconds for batch of {len(resumes_data)} resumes")
             raise TimeoutError(f"Processing exceeded {timeout} seconds")
-        
-        # Check for exceptions
-        if not exception_queue.empty():
-            raise exception_queue.get()
-        
-        # Get the result
-        if not result_queue.empty():
-            return result_queue.get()
-        else:
-            raise Exception("Worker thread completed but no result was returned")
     
-    def _is_valid_summary(self, summary):
-        """Validate that the summary has required fields and is not a formatting failure"""
+    def _lowercase_text_fields(self, summary):
+        """Lowercase nickname and summary once so validation and failure detection can share them"""
         if not isinstance(summary, dict):
-            return False
-            
-        required_keys = ['nickname', 'summary', 'reservations', 'relevant_achievements', 'wildcard']
-        has_required_keys = all(key in summary for key in required_keys)
-        
-        if not has_required_keys:
-            return False
-        
-        # Check for formatting failure marker
-        if summary.get('_formatting_failure', False):
-            return False
-            
-        # Additional quality checks
-        # Check for generic fallback content that indicates poor processing
-        if summary.get('nickname') in ['Review Pending', 'Processing Error', 'Formatting Issue']:
-            return False
-            
-        # Check if summary contains error indicators
-        summary_text = summary.get('summary', '')
-        if any(phrase in summary_text.lower() for phrase in [
-            'error occurred',
-            'processing issues',
-            'manual review due to',
-            'format was invalid'
-        ]):
-            return False
-            
-        return True
+            return None
+        # The model may return null or a non-string for either field
+        return str(summary.get('nickname') or '').lower(), str(summary.get('summary') or '').lower()
+    
+    def _is_valid_summary(self, summary, lowered=None):
+        """Validate that the summary has required fields and is not a formatting failure"""
+        # Same predicate the analysis cache uses, so a rejected result is never cached and replayed
+        return is_valid_analysis(summary, lowered[1] if lowered else None)
     
-    def _detect_failure_type(self, summary):
+    def _detect_failure_type(self, summary, lowered=None):
         """Detect if this is a formatting failure vs other types of failures"""
         if not isinstance(summary, dict):
             return 'invalid_result'
@@ -520,21 +621,12 @@ class BackgroundProcessor:
             return 'formatting_failure'
             
         # Check for formatting-related indicators
-        nickname = summary.get('nickname', '')
-        summary_text = summary.get('summary', '')
-        
-        formatting_indicators = [
-            'formatting issue',
-            'format was invalid',
-            'json parsing failed',
-            'response format',
-            'quality issues'
-        ]
+        nickname_lc, summary_lc = lowered or self._lowercase_text_fields(summary)
         
-        if any(indicator in nickname.lower() for indicator in formatting_indicators):
+        if any(indicator in nickname_lc for indicator in FORMATTING_INDICATORS):
             return 'formatting_failure'
             
-        if any(indicator in summary_text.lower() for indicator in formatting_indicators):
+        if any(indicator in summary_lc for indicator in FORMATTING_INDICATORS):
             return 'formatting_failure'
             
         # Default to invalid result for other quality issues
@@ -581,15 +673,15 @@ class BackgroundProcessor:
         # Save retry state after any queue modification
         self._save_retry_state()
     
-    def _process_retry_queues(self, customization_settings):
-        """Process any remaining items in retry queues"""
+    def _process_retry_queues(self, customization_settings, run: threading.Event):
+        """Process any remaining items in retry queues until run is cleared"""
         retry_candidates = self._get_retry_candidates()
         
         if retry_candidates:
             logger.info(f"Processing {len(retry_candidates)} retry candidates")
             
             for candidate in retry_candidates:
-                if not self.is_processing:
+                if not run.is_set():
                     break
                     
                 self._process_batch_enhanced([candidate], customization_settings)
@@ -600,12 +692,16 @@ class BackgroundProcessor:
         with self.processing_lock:
             newly_processed_count = len(self.newly_processed)
         
+        # Read each counter once so the reported progress is self-consistent
+        processed_count = self.processed_count.value
+        total_count = self.total_count.value
+        
         return {
             "is_processing": self.is_processing,
             "status": self.status,
-            "processed_count": self.processed_count,
-            "total_count": self.total_count,
-            "progress": (self.processed_count / self.total_count * 100) if self.total_count > 0 else 0,
+            "processed_count": processed_count,
+            "total_count": total_count,
+            "progress": (processed_count / total_count * 100) if total_count > 0 else 0,
             "newly_processed_count": newly_processed_count,
             "retry_queues": {
                 "quick_retry": len(self.retry_queues['quick_retry']),
@@ -651,7 +747,7 @@ class BackgroundProcessor:
     
     def force_process_batch(self, candidate_ids: List[str]) -> Dict[str, Dict]:
         """Force process specific candidates immediately with long timeout"""
-        customization_settings = self.candidate_service.customization_service.get_settings()
+        customization_settings = dict(self.candidate_service.customization_service.get_settings())
         resumes = self.resume_parser.get_all_resumes(self.candidate_service.candidates_folder)
         
         target_resumes = [r for r in resumes if r['id'] in candidate_ids]
@@ -665,6 +761,7 @@ class BackgroundProcessor:
         
         try:
             self._process_batch_enhanced(target_resumes, customization_settings)
+            self.candidate_service._save_summaries()
             
             # Return results for the requested candidates
             results = {}
@@ -678,9 +775,19 @@ class BackgroundProcessor:
             # Restore original timeout
             self.config['default_timeout'] = original_timeout
     
+    def _stop_run(self):
+        """Tell the current run to stop after its batch, and abandon any bulk job it waits on"""
+        self._processing.clear()
+        self._cancel.set()
+    
+    def restart_processing(self):
+        """Stop the current run and start a fresh one, e.g. after the job description changes"""
+        self._stop_run()
+        self.start_background_processing()
+    
     def stop_processing(self):
         """Stop background processing"""
-        self.is_processing = False
+        self._stop_run()
         if self.processing_thread and self.processing_thread.is_alive():
             self.processing_thread.join(timeout=10)
         logger.info("Background processing stopped") 
\ No newline at end of file
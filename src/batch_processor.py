@@ -1,443 +1,1185 @@
 import asyncio
+import copy
 import json
+import logging
+import os
+import random
 import time
+import threading
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 import re # Added for regex-based JSON cleaning
+from .analysis_cache import AnalysisCache
+from .resume_analysis import ResumeAnalysis
+
+logger = logging.getLogger(__name__)
+
+try:
+    # orjson parses large LLM responses several times faster than the stdlib
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
+try:
+    # SIMD parser for big multi-resume replies; its parser objects aren't thread-safe
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+try:
+    from json_repair import repair_json
+except ImportError:
+    repair_json = None
+
+# How much of each resume goes into a prompt, in tokens
+BATCH_RESUME_TOKENS = 2000      # per resume in a multi-resume prompt
+SINGLE_RESUME_TOKENS = 3000     # single-resume analysis
+ENHANCED_RESUME_TOKENS = 2500   # enhanced-formatting retry
+JSON_RETRY_RESUME_TOKENS = 2000 # JSON-focused retry
+CHARS_PER_TOKEN = 4             # character budget used when tiktoken isn't installed
+BATCH_PROMPT_TOKEN_BUDGET = 16000  # resume content packed into one multi-resume prompt
+# Cap on the reply, per resume analyzed; decode time grows with every output token. Above a
+# complete analysis (~600-900 tokens), so it only cuts off runaway replies. The adapter clamps
+# the batch total to the model's output and context limits
+RESULT_MAX_TOKENS = 1500
+
+# Rate limits and server hiccups are retried with jittered exponential backoff
+TRANSIENT_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+LLM_RETRY_ATTEMPTS = 3
+LLM_RETRY_BASE_DELAY = 1.0
+
+# What a usable analysis looks like; anything else is retried rather than stored or cached
+REQUIRED_SUMMARY_KEYS = frozenset(['nickname', 'summary', 'reservations', 'relevant_achievements', 'wildcard'])
+FALLBACK_NICKNAMES = frozenset(['Review Pending', 'Processing Error', 'Formatting Issue'])
+SUMMARY_ERROR_PHRASES = (
+    'error occurred',
+    'processing issues',
+    'manual review due to',
+    'format was invalid'
+)
+
+def is_valid_analysis(result, summary_lc: Optional[str] = None) -> bool:
+    """True for a complete analysis, False for error, fallback and formatting-failure placeholders.
+    
+    summary_lc is the already-lowercased summary, when the caller has it.
+    """
+    if not isinstance(result, dict):
+        return False
+    if not REQUIRED_SUMMARY_KEYS.issubset(result):
+        return False
+    if result.get('_formatting_failure', False):
+        return False
+    # Generic fallback content indicates poor processing
+    if result.get('nickname') in FALLBACK_NICKNAMES:
+        return False
+    if summary_lc is None:
+        summary_lc = str(result.get('summary') or '').lower()
+    return not any(phrase in summary_lc for phrase in SUMMARY_ERROR_PHRASES)
+
+class BatchTimeoutError(TimeoutError):
+    """Some chunks of a batch timed out; carries the results of the chunks that finished"""
+    
+    def __init__(self, message: str, results: Dict[str, Dict], timed_out_ids: List[str]):
+        super().__init__(message)
+        self.results = results
+        self.timed_out_ids = timed_out_ids
+
+def is_transient_llm_error(error: Exception) -> bool:
+    """True for provider errors worth retrying (rate limiting, 5xx, dropped connections)"""
+    if isinstance(error, TimeoutError):
+        # Timeouts carry the caller's deadline; retrying would overrun it
+        return False
+    return (
+        getattr(error, 'status_code', None) in TRANSIENT_STATUS_CODES
+        or isinstance(error, ConnectionError)
+        or type(error).__name__ in ('RateLimitError', 'APIConnectionError')
+    )
+
+def retry_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given (zero-based) retry attempt"""
+    return random.uniform(0, LLM_RETRY_BASE_DELAY * (2 ** attempt))
+
+# Replies smaller than this don't repay simdjson's per-parse setup
+SIMDJSON_MIN_CHARS = 8192
+_simdjson_local = threading.local()
+
+def loads_llm_json(text: str):
+    """Parse JSON text, using simdjson for large payloads when it is installed"""
+    if simdjson is None or len(text) < SIMDJSON_MIN_CHARS:
+        return _json_loads(text)
+    
+    parser = getattr(_simdjson_local, 'parser', None)
+    if parser is None:
+        parser = _simdjson_local.parser = simdjson.Parser()
+    try:
+        return parser.parse(text.encode('utf-8'), recursive=True)
+    except ValueError as e:
+        raise json.JSONDecodeError(str(e), text, 0) from e
+
+# Markdown wrappers LLMs put around JSON: ```json / ``` fences and a bare "json" line
+MARKDOWN_FENCE_RE = re.compile(r'^```json\s*|^```\s*|\s*```$|^json\s*', re.MULTILINE)
+# Repairs for common LLM JSON mistakes: trailing commas, and missing commas between
+# adjacent objects/arrays, all in one pass
+JSON_REPAIR_RE = re.compile(r',(?=\s*[}\]])|}\s*{|]\s*\[')
+JSON_REPAIRS = {',': '', '}': '},{', ']': '],['}
+
+def _repair_json_match(match: 're.Match') -> str:
+    return JSON_REPAIRS[match.group(0)[0]]
+
+# The usual case: the whole reply is one fenced block
+FENCED_BLOCK_RE = re.compile(r'\A\s*```(?:json)?\s*(.*?)\s*```\s*\Z', re.DOTALL)
+
+def clean_llm_json(text: str) -> str:
+    """Strip markdown fences and surrounding whitespace from an LLM reply"""
+    stripped = text.strip()
+    if stripped[:1] in ('{', '[') and stripped[-1:] in ('}', ']'):
+        # Already bare JSON, nothing to strip
+        return stripped
+    match = FENCED_BLOCK_RE.match(text)
+    if match:
+        return match.group(1)
+    return MARKDOWN_FENCE_RE.sub('', stripped).strip()
+
+# Characters that matter when walking JSON structure; everything else is skipped in C
+JSON_STRUCTURE_RE = re.compile(r'[{}\[\]"\\]')
+# Top-level bracketed spans tried when carving JSON out of prose, before falling back to outermost brackets
+JSON_EXTRACT_MAX_CANDIDATES = 8
+
+def _balanced_value_span(text: str, pos: int = 0) -> Optional[Tuple[int, int]]:
+    """(start, end) of the first balanced {...} or [...] opening at or after pos, or None if none closes"""
+    start = None
+    depth = 0
+    in_string = False
+    skip_to = -1
+    
+    for match in JSON_STRUCTURE_RE.finditer(text, pos):
+        i = match.start()
+        if i < skip_to:
+            continue
+        char = match.group()
+        if in_string:
+            if char == '\\':
+                skip_to = i + 2
+            elif char == '"':
+                in_string = False
+        elif start is None:
+            # Ignore any preamble until the value opens
+            if char in '{[':
+                start = i
+                depth = 1
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+            if depth == 0:
+                return start, i + 1
+    return None
+
+def iter_json_values(text: str, limit: int = JSON_EXTRACT_MAX_CANDIDATES):
+    """Top-level balanced {...}/[...] candidates in text, each scan resuming past the previous
+    span, so bracketed prose ("[1 resume]", "{see below}") doesn't hide the JSON that follows
+    and a value nested inside an earlier span is never offered on its own"""
+    pos = 0
+    for _ in range(limit):
+        span = _balanced_value_span(text, pos)
+        if span is None:
+            return
+        yield text[span[0]:span[1]]
+        pos = span[1]
+
+class JsonArrayStream:
+    """Incrementally picks complete top-level objects out of a streamed JSON array.
+    
+    Only a reply whose first JSON token is "[" is streamed; anything else (a lone object,
+    say) yields nothing and is left to whole-response parsing.
+    """
+    
+    def __init__(self):
+        self.buffer = ''
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.object_start = None
+        self.finished = False   # The top-level array closed, or the reply isn't an array
+    
+    def feed(self, chunk: str) -> List[str]:
+        """Add streamed text and return the source of every array element completed by it"""
+        if self.finished:
+            return []
+        self.buffer += chunk
+        completed = []
+        buffer = self.buffer
+        
+        for i in range(self.pos, len(buffer)):
+            char = buffer[i]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif self.depth == 0:
+                # Skip any preamble or markdown fence until the first JSON token
+                if char == '[':
+                    self.depth = 1
+                elif char == '{':
+                    # An object, not the results array: its nested arrays aren't results
+                    self.finished = True
+                    break
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                if self.depth == 1 and char == '{':
+                    self.object_start = i
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if self.depth == 1 and char == '}' and self.object_start is not None:
+                    completed.append(buffer[self.object_start:i + 1])
+                    self.object_start = None
+                elif self.depth == 0:
+                    self.finished = True
+                    break
+        
+        # Drop text that can no longer be part of an element
+        keep_from = self.object_start if self.object_start is not None else len(buffer)
+        if self.object_start is not None:
+            self.object_start = 0
+        self.buffer = buffer[keep_from:]
+        self.pos = len(self.buffer)
+        return completed
+
+# Gendered pronouns in LLM output and their neutral replacements, matched in one pass
+GENDER_PRONOUNS = {
+    'he': 'they', 'him': 'them', 'his': 'their',
+    'she': 'they', 'her': 'their', 'hers': 'theirs',
+    'He': 'They', 'Him': 'Them', 'His': 'Their',
+    'She': 'They', 'Her': 'Their', 'Hers': 'Theirs',
+}
+GENDER_PRONOUN_RE = re.compile(r'\b(?:' + '|'.join(sorted(GENDER_PRONOUNS, key=len, reverse=True)) + r')\b')
+
+def _neutral_pronoun(match: 're.Match') -> str:
+    return GENDER_PRONOUNS[match.group(0)]
+
+# [CANDIDATE] markers that start sentences awkwardly, with an optional "is"/"has" after them
+CANDIDATE_MARKER_RE = re.compile(r'\[CANDIDATE\]\s+(?:(is|has)\s+)?', re.IGNORECASE)
+
+def _candidate_phrase(match: 're.Match') -> str:
+    verb = match.group(1)
+    return f'This candidate {verb.lower()} ' if verb else 'The candidate '
+# Anything _scrub_text would rewrite (a superset is fine); most evidence quotes have none
+SCRUBBABLE_RE = re.compile(GENDER_PRONOUN_RE.pattern + r'|\[CANDIDATE\]', re.IGNORECASE)
+
+# Resume header lines that are contact details rather than the candidate's name
+CONTACT_LINE_RE = re.compile(r'@|phone|email|address|www|linkedin', re.IGNORECASE)
+# A header line of 2-3 capitalized words, e.g. "Jane Doe" (ASCII lines only)
+NAME_LINE_RE = re.compile(r'[A-Z][a-z]*(?:\s+[A-Z][a-z]*){1,2}')
+# File name pieces: the extension, and the separators between name parts
+FILE_EXTENSION_RE = re.compile(r'\.[^.]+$')
+FILENAME_SEPARATOR_RE = re.compile(r'[_\s]+')
+# Capitalized words that show up in resume headers and file names but aren't names
+NAME_STOPWORDS = frozenset(['Resume', 'CV', 'The', 'And', 'Or'])
+
+# Nicknames only ever produced by defaults and fallbacks, never by a real analysis
+GENERIC_NICKNAMES = frozenset(['Anonymous Pro', 'Review Pending', 'Processing Error'])
+# Response quality heuristics, matched case-insensitively without lowercasing a copy first
+FALLBACK_PHRASE_RE = re.compile(r'manual review|error|unable', re.IGNORECASE)
+WORK_INDICATOR_RE = re.compile(r'experience|employment|work|position|job|company|corp|inc|llc', re.IGNORECASE)
+FORMATTING_ARTIFACT_RE = re.compile(r'```|json|markdown', re.IGNORECASE)
+
+# Keywords that mark useful sentences in a reply that couldn't be parsed as JSON
+CONCERN_KEYWORDS = ('concern', 'gap', 'lack', 'missing', 'weakness', 'limitation', 'however', 'but')
+ACHIEVEMENT_KEYWORDS = ('achievement', 'accomplished', 'led', 'managed', 'increased', 'improved', 'built', 'created')
+
+# Static analysis instructions, built once at import instead of on every prompt
+BATCH_PROMPT_INSTRUCTIONS = """
+Analyze the resumes below based on the following job description.
+
+CRITICAL INSTRUCTIONS:
+1. DO NOT use generic phrases like "seasoned expert", "proven track record", "perfect fit", "strong background", or any statement that could apply to more than 30% of applicants
+2. CITE EVIDENCE: For EVERY claim you make, include the EXACT VERBATIM quote from the resume that supports it. Do NOT paraphrase, summarize, or infer - copy the exact words. Keep each quote to 25 words or fewer.
+3. START WITH DIFFERENTIATORS: Begin by identifying what makes each candidate DIFFERENT from typical applicants
+4. If you cannot find a direct quote to support a claim, do NOT make that claim
+5. SUBSTANTIVE ACHIEVEMENTS: Focus on achievements with concrete numbers, measurable impact, or significant scope (team size, budget, users affected, percentage improvements, etc.)
+6. WORK HISTORY: Extract ALL work experiences from the resume (up to 5 maximum). Do NOT arbitrarily limit to 2-3 jobs when more are available.
+
+🚨 CRITICAL ANONYMITY REQUIREMENTS 🚨
+- NEVER mention the candidate's real name, first name, last name, or any personal identifiers
+- NEVER use pronouns that reveal gender (he/him, she/her) - use "they/them" or avoid pronouns entirely
+- NEVER start summaries with names like "John is..." or "Sarah has..." 
+- Use role-based descriptions: "This candidate...", "The applicant...", "This professional..."
+- Keep the focus on skills, experience, and achievements - NOT personal identity
+- Examples of GOOD openings: "Experienced software engineer with...", "Seasoned marketing professional who...", "Technical leader specializing in..."
+- Examples of BAD openings: "John is a software engineer...", "Sarah brings 5 years...", "Michael has experience..."
+
+⚠️  CRITICAL JSON FORMATTING REQUIREMENTS ⚠️
+- You MUST return ONLY a valid JSON array
+- Do NOT include any text before or after the JSON
+- Do NOT wrap in markdown code blocks (no ```json or ```)
+- Do NOT include any explanatory text
+- Ensure all strings are properly escaped with double quotes
+- Ensure all arrays and objects have proper comma separation
+- Test your JSON mentally before responding to ensure it's valid
+
+Return a JSON array, with each object containing these exact keys:
+
+- "differentiators": An array of 3 things that make this candidate UNIQUE compared to typical applicants for this role. Each item should be an object with:
+  - "claim": The unique aspect (be specific, not generic, and CONCISE - avoid filler words like "effectively", "successfully", "efficiently")
+  - "evidence": The EXACT VERBATIM quote from the resume (copy word-for-word, no paraphrasing)
+
+- "nickname": A 2-3 word nickname based on their UNIQUE profile (e.g., "Quantum Researcher", "Startup Veteran", "Patent Holder"). NO generic terms like "Tech Expert"
+
+- "summary": A brief 1-2 line summary focusing on SPECIFIC experiences and achievements, not generic qualities
+
+- "reservations": An array of 2-3 SPECIFIC concerns or gaps for this specific role (focus on what's missing or lacking, no evidence quotes needed for gaps)
+
+- "relevant_achievements": An array of exactly 4 SUBSTANTIVE, QUANTIFIED achievements that directly relate to this role. Each should be an object with:
+  - "achievement": A specific, impactful accomplishment with numbers/metrics that shows capability for this role
+  - "evidence": The EXACT VERBATIM quote from resume (copy word-for-word)
+
+- "wildcard": An object with:
+  - "fact": A unique, interesting aspect that likely wouldn't appear in other resumes
+  - "evidence": The EXACT VERBATIM quote supporting this (copy word-for-word)
+
+- "work_history": An array of work experiences. IMPORTANT: Extract ALL available work experiences from the resume, up to a maximum of 5. If the resume shows 5+ jobs, include all 5. If it shows 4 jobs, include all 4. Do NOT limit to just 2-3 entries. Each should be an object with "title", "company", and "years". Order from most recent to oldest.
+
+- "experience_distribution": An object with years in different sectors: {"corporate": 0, "startup": 0, "nonprofit": 0, "government": 0, "education": 0, "other": 0}
+
+EXAMPLE JSON STRUCTURE (adapt to actual resume content):
+[
+  {
+    "differentiators": [
+      {"claim": "Holder of 15 AI patents", "evidence": "Invented and patented 15 machine learning algorithms"},
+      {"claim": "Led 200-person engineering org", "evidence": "VP Engineering managing 200+ engineers across 12 teams"},
+      {"claim": "Scaled systems to 50M users", "evidence": "Architected platform serving 50 million daily active users"}
+    ],
+    "nickname": "AI Patent Holder",
+    "summary": "VP Engineering with 15 AI patents who scaled platforms to 50M users and managed 200+ person teams.",
+    "reservations": ["No direct fintech experience", "May be overqualified for IC role"],
+    "relevant_achievements": [
+      {"achievement": "Reduced infrastructure costs by 40%", "evidence": "Led cloud migration saving $2M annually"},
+      {"achievement": "Improved system uptime to 99.9%", "evidence": "Achieved 99.9% uptime across all services"},
+      {"achievement": "Launched product used by 10M users", "evidence": "Shipped recommendation engine to 10M+ users"},
+      {"achievement": "Built team from 20 to 200 engineers", "evidence": "Grew engineering org from 20 to 200 in 2 years"}
+    ],
+    "wildcard": {"fact": "Published research in Nature", "evidence": "Co-authored paper on quantum computing in Nature journal"},
+    "work_history": [
+      {"title": "VP Engineering", "company": "TechCorp", "years": "2020-2024"},
+      {"title": "Senior Director", "company": "StartupXYZ", "years": "2018-2020"},
+      {"title": "Engineering Manager", "company": "BigTech", "years": "2015-2018"}
+    ],
+    "experience_distribution": {"corporate": 6, "startup": 3, "nonprofit": 0, "government": 0, "education": 0, "other": 0}
+  }
+]
+"""
+
+SINGLE_PROMPT_INSTRUCTIONS = """
+Analyze this resume based on the job description below.
+
+CRITICAL INSTRUCTIONS:
+1. DO NOT use generic phrases like "seasoned expert", "proven track record", "perfect fit", "strong background", or any statement that could apply to more than 30% of applicants
+2. CITE EVIDENCE: For EVERY claim you make, include the EXACT VERBATIM quote from the resume that supports it. Do NOT paraphrase, summarize, or infer - copy the exact words. Keep each quote to 25 words or fewer.
+3. START WITH DIFFERENTIATORS: Begin by identifying what makes this candidate DIFFERENT from typical applicants
+4. If you cannot find a direct quote to support a claim, do NOT make that claim
+5. SUBSTANTIVE ACHIEVEMENTS: Focus on achievements with concrete numbers, measurable impact, or significant scope (team size, budget, users affected, percentage improvements, etc.)
+6. WORK HISTORY: Extract ALL work experiences from the resume (up to 5 maximum). Do NOT arbitrarily limit to 2-3 jobs when more are available.
+
+🚨 CRITICAL ANONYMITY REQUIREMENTS 🚨
+- NEVER mention the candidate's real name, first name, last name, or any personal identifiers
+- NEVER use pronouns that reveal gender (he/him, she/her) - use "they/them" or avoid pronouns entirely
+- NEVER start summaries with names like "John is..." or "Sarah has..." 
+- Use role-based descriptions: "This candidate...", "The applicant...", "This professional..."
+- Keep the focus on skills, experience, and achievements - NOT personal identity
+- Examples of GOOD openings: "Experienced software engineer with...", "Seasoned marketing professional who...", "Technical leader specializing in..."
+- Examples of BAD openings: "John is a software engineer...", "Sarah brings 5 years...", "Michael has experience..."
+
+⚠️  CRITICAL JSON FORMATTING REQUIREMENTS ⚠️
+- You MUST return ONLY a valid JSON object
+- Do NOT include any text before or after the JSON
+- Do NOT wrap in markdown code blocks (no ```json or ```)
+- Do NOT include any explanatory text
+- Ensure all strings are properly escaped with double quotes
+- Ensure all arrays and objects have proper comma separation
+- Test your JSON mentally before responding to ensure it's valid
+
+Return a JSON object with these exact keys:
+
+- "differentiators": An array of 3 things that make this candidate UNIQUE compared to typical applicants for this role. Each item should be an object with:
+  - "claim": The unique aspect (be specific, not generic, and CONCISE - avoid filler words like "effectively", "successfully", "efficiently")
+  - "evidence": The EXACT VERBATIM quote from the resume (copy word-for-word, no paraphrasing)
+
+- "nickname": A 2-3 word nickname based on their UNIQUE profile (e.g., "Quantum Researcher", "Startup Veteran", "Patent Holder"). NO generic terms like "Tech Expert"
+
+- "summary": A brief 2-3 line summary focusing on SPECIFIC experiences and achievements, not generic qualities
+
+- "reservations": An array of 2-3 SPECIFIC concerns or gaps for this specific role (focus on what's missing or lacking, no evidence quotes needed for gaps)
+
+- "relevant_achievements": An array of exactly 4 SUBSTANTIVE, QUANTIFIED achievements that directly relate to this role. Each should be an object with:
+  - "achievement": A specific, impactful accomplishment with numbers/metrics that shows capability for this role
+  - "evidence": The EXACT VERBATIM quote from resume (copy word-for-word)
+
+- "wildcard": An object with:
+  - "fact": A unique, interesting aspect that likely wouldn't appear in other resumes
+  - "evidence": The EXACT VERBATIM quote supporting this (copy word-for-word)
+
+- "work_history": An array of work experiences. IMPORTANT: Extract ALL available work experiences from the resume, up to a maximum of 5. If the resume shows 5+ jobs, include all 5. If it shows 4 jobs, include all 4. Do NOT limit to just 2-3 entries. Each should be an object with "title", "company", and "years". Order from most recent to oldest.
+
+- "experience_distribution": An object with years in different sectors: {"corporate": 0, "startup": 0, "nonprofit": 0, "government": 0, "education": 0, "other": 0}
+
+EXAMPLE JSON STRUCTURE (adapt to actual resume content):
+{
+  "differentiators": [
+    {"claim": "Holder of 15 AI patents", "evidence": "Invented and patented 15 machine learning algorithms"},
+    {"claim": "Led 200-person engineering org", "evidence": "VP Engineering managing 200+ engineers across 12 teams"},
+    {"claim": "Scaled systems to 50M users", "evidence": "Architected platform serving 50 million daily active users"}
+  ],
+  "nickname": "AI Patent Holder",
+  "summary": "VP Engineering with 15 AI patents who scaled platforms to 50M users and managed 200+ person teams.",
+  "reservations": ["No direct fintech experience", "May be overqualified for IC role"],
+  "relevant_achievements": [
+    {"achievement": "Reduced infrastructure costs by 40%", "evidence": "Led cloud migration saving $2M annually"},
+    {"achievement": "Improved system uptime to 99.9%", "evidence": "Achieved 99.9% uptime across all services"},
+    {"achievement": "Launched product used by 10M users", "evidence": "Shipped recommendation engine to 10M+ users"},
+    {"achievement": "Built team from 20 to 200 engineers", "evidence": "Grew engineering org from 20 to 200 in 2 years"}
+  ],
+  "wildcard": {"fact": "Published research in Nature", "evidence": "Co-authored paper on quantum computing in Nature journal"},
+  "work_history": [
+    {"title": "VP Engineering", "company": "TechCorp", "years": "2020-2024"},
+    {"title": "Senior Director", "company": "StartupXYZ", "years": "2018-2020"},
+    {"title": "Engineering Manager", "company": "BigTech", "years": "2015-2018"}
+  ],
+  "experience_distribution": {"corporate": 6, "startup": 3, "nonprofit": 0, "government": 0, "education": 0, "other": 0}
+}
+"""
+
+ENHANCED_FORMATTING_INSTRUCTIONS = """
+CRITICAL: The previous attempt failed due to formatting issues. You MUST follow these requirements exactly.
+
+🚨 MANDATORY JSON OUTPUT FORMAT 🚨
+- Your response must be ONLY a JSON object
+- Start with { and end with }
+- NO text before the JSON
+- NO text after the JSON
+- NO markdown code blocks (```json or ```)
+- NO explanations or comments
+- Use double quotes for ALL strings
+- Ensure proper comma placement
+
+Task: Analyze this resume and return a properly formatted JSON object.
+
+Required JSON structure (fill with actual content from resume):
+{
+  "differentiators": [
+    {"claim": "Specific unique aspect", "evidence": "Exact quote from resume"},
+    {"claim": "Another unique aspect", "evidence": "Another exact quote"},
+    {"claim": "Third unique aspect", "evidence": "Third exact quote"}
+  ],
+  "nickname": "Specific Role Name",
+  "summary": "Brief summary with specific achievements and experience",
+  "reservations": ["Specific concern 1", "Specific concern 2"],
+  "relevant_achievements": [
+    {"achievement": "Quantified achievement", "evidence": "Exact quote"},
+    {"achievement": "Another quantified achievement", "evidence": "Another quote"},
+    {"achievement": "Third quantified achievement", "evidence": "Third quote"},
+    {"achievement": "Fourth quantified achievement", "evidence": "Fourth quote"}
+  ],
+  "wildcard": {"fact": "Unique interesting fact", "evidence": "Exact supporting quote"},
+  "work_history": [
+    {"title": "Job Title", "company": "Company Name", "years": "2020-2024"},
+    {"title": "Previous Title", "company": "Previous Company", "years": "2018-2020"}
+  ],
+  "experience_distribution": {"corporate": 0, "startup": 0, "nonprofit": 0, "government": 0, "education": 0, "other": 0}
+}
+"""
+
+JSON_RETRY_INSTRUCTIONS = """
+The previous response was not valid JSON. Please analyze this resume and return ONLY a properly formatted JSON object.
+
+STRICT JSON REQUIREMENTS:
+- Return ONLY JSON - no explanations, no markdown, no extra text
+- Use proper JSON syntax with double quotes for all strings
+- Ensure proper comma placement and bracket matching
+- Do not include any text before or after the JSON object
+
+Return a valid JSON object with these keys: differentiators, nickname, summary, reservations, relevant_achievements, wildcard, work_history, experience_distribution
+"""
+
+@lru_cache(maxsize=16)
+def build_prompt_prefix(instructions: str, job_description: str, resume_heading: str) -> str:
+    """Instructions + job description: the part of a prompt shared by every resume in a run.
+    
+    Provider prompt caching (OpenAI/Anthropic) only matches an identical leading
+    prefix, so anything that varies per resume must come after this block.
+    """
+    return "".join([
+        instructions,
+        "\nJob Description:\n",
+        job_description if job_description else "Not provided.",
+        "\n\n",
+        resume_heading,
+    ])
+
+# LLM calls are I/O bound, so size the pool off the core count rather than a fixed handful
+DEFAULT_IO_WORKERS = int(os.getenv('RESUME_LLM_WORKERS', 0)) or min(32, (os.cpu_count() or 4) * 2)
+
+_shared_executor = None
+_shared_executor_lock = threading.Lock()
+
+def get_shared_executor() -> ThreadPoolExecutor:
+    """Process-wide thread pool for LLM calls, created on first use"""
+    global _shared_executor
+    with _shared_executor_lock:
+        if _shared_executor is None:
+            _shared_executor = ThreadPoolExecutor(max_workers=DEFAULT_IO_WORKERS, thread_name_prefix='llm')
+        return _shared_executor
+
+class RequestRateLimiter:
+    """Spaces LLM requests evenly to stay under a requests-per-minute budget.
+    
+    Shared by the sync and async paths, so it keeps its own clock instead of
+    binding to an event loop.
+    """
+    def __init__(self, requests_per_minute: Optional[int] = None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+    
+    def _reserve(self) -> float:
+        """Claim the next request slot and return how long to wait for it"""
+        if not self.interval:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+            return slot - now
+    
+    def wait(self):
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+    
+    async def wait_async(self):
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class BatchSizeController:
+    """Tunes resumes-per-prompt from observed latency per resume.
+    
+    Bigger prompts amortize the shared instructions but take longer to return,
+    so grow the batch while per-resume latency keeps falling and back off once
+    it rises well above the running average.
+    """
+    def __init__(self, initial: int = 3, min_size: int = 1, max_size: int = 16, smoothing: float = 0.3):
+        self.current = initial
+        self.min_size = min_size
+        self.max_size = max_size
+        self.smoothing = smoothing
+        self.ema_per_item = None
+        self.lock = threading.Lock()
+    
+    def record(self, elapsed: float, items: int):
+        """Feed the wall time of one chunk of `items` resumes"""
+        if items <= 0:
+            return
+        per_item = elapsed / items
+        with self.lock:
+            if self.ema_per_item is None:
+                self.ema_per_item = per_item
+                return
+            if per_item < 0.9 * self.ema_per_item:
+                self.current = min(self.max_size, self.current + 1)
+            elif per_item > 1.2 * self.ema_per_item:
+                self.current = max(self.min_size, self.current - 1)
+            self.ema_per_item += self.smoothing * (per_item - self.ema_per_item)
 
 class BatchProcessor:
-    def __init__(self, llm_service, max_workers=5):
+    def __init__(self, llm_service, max_workers=None, cache=None, max_in_flight=50, rate_limit_rpm=None, json_mode=False,
+                 max_output_tokens=RESULT_MAX_TOKENS):
         self.llm_service = llm_service
-        self.max_workers = max_workers
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Processors share one pool unless a caller asks for a dedicated size
+        self.owns_executor = max_workers is not None
+        self.max_workers = max_workers if self.owns_executor else DEFAULT_IO_WORKERS
+        self._executor = None   # Created on first submit; sync-only and async callers never need it
+        self._executor_lock = threading.Lock()
+        self.cache = cache if cache is not None else AnalysisCache()
+        
+        # Concurrency (requests in flight) and rate (requests per minute) are limited separately
+        self.max_in_flight = max_in_flight
+        self.rate_limiter = RequestRateLimiter(rate_limit_rpm)
+        
+        # Chooses resumes per prompt when callers don't pass batch_size
+        self.batch_sizer = BatchSizeController()
+        
+        # Ask the provider for guaranteed-JSON replies on single-resume calls (needs a model that supports it)
+        self.json_mode = json_mode
+        
+        # Reply token cap per resume analyzed (None sends no cap, e.g. for reasoning models)
+        self.max_output_tokens = max_output_tokens
+        
+        # Token-aware resume truncation, memoized per (candidate, budget)
+        self.encoding = self._load_encoding()
+        self.truncated_texts = {}
+        # Compiled name-redaction pattern per candidate, shared by every prompt budget
+        self.name_patterns = {}
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Thread pool for overlapping chunk requests, created on first use"""
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers) if self.owns_executor else get_shared_executor()
+        return self._executor
+    
+    def _load_encoding(self):
+        """Tokenizer for the configured model, or None to fall back to character budgets"""
+        if tiktoken is None:
+            return None
+        model_name = os.getenv('OPENAI_DEFAULT_MODEL', 'gpt-4')
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding('o200k_base')
+        except Exception as e:
+            logger.warning("Tokenizer unavailable, truncating resumes by characters: %s", e)
+            return None
+    
+    def _truncate_resume(self, resume_data: Dict, max_tokens: int) -> str:
+        """Resume text cut to max_tokens, computed once per resume and reused across retries"""
+        return self._truncation(resume_data, max_tokens)[0]
+    
+    def _resume_tokens(self, resume_data: Dict, max_tokens: int) -> int:
+        """Token count of the truncated resume text"""
+        return self._truncation(resume_data, max_tokens)[1]
+    
+    def _truncation(self, resume_data: Dict, max_tokens: int, token_ids: Optional[List[int]] = None):
+        """(truncated text, token count), memoized per (resume id, budget)"""
+        text = resume_data['text']
+        key = (resume_data['id'], max_tokens)
+        cached = self.truncated_texts.get(key)
+        if cached is not None and cached[0] is text:
+            return cached[1]
+        
+        if self.encoding is None:
+            truncated = text[:max_tokens * CHARS_PER_TOKEN]
+            token_count = -(-len(truncated) // CHARS_PER_TOKEN)
+        else:
+            if token_ids is None:
+                token_ids = self.encoding.encode(text, disallowed_special=())
+            if len(token_ids) <= max_tokens:
+                truncated, token_count = text, len(token_ids)
+            else:
+                truncated, token_count = self.encoding.decode(token_ids[:max_tokens]), max_tokens
+        truncated = self._redact_names(resume_data, truncated)
+        
+        if len(self.truncated_texts) >= 1000:
+            self.truncated_texts.clear()
+        self.truncated_texts[key] = (text, (truncated, token_count))
+        return truncated, token_count
+    
+    def _redact_names(self, resume_data: Dict, text: str) -> str:
+        """Replace the candidate's known name in prompt text, so the LLM never sees who it is analyzing"""
+        name_pattern = self._name_patterns(resume_data)[0]
+        if name_pattern is None:
+            return text
+        return name_pattern.sub('[CANDIDATE]', text)
+    
+    def _name_patterns(self, resume_data: Dict):
+        """(prompt pattern, reply pattern) for this candidate, memoized per resume id
+        
+        Prompts only redact the name parsed from the filename: the header-line guess also
+        matches job titles ("Data Scientist") and would blank them out of the resume the
+        model analyzes. Replies are scrubbed with every guess, as a last line of defence.
+        """
+        text = resume_data.get('text', '')
+        cached = self.name_patterns.get(resume_data['id'])
+        if cached is not None and cached[0] is text:
+            return cached[1]
+        
+        patterns = (
+            self._compile_name_pattern(self._extract_candidate_names(resume_data, include_header_lines=False)),
+            self._compile_name_pattern(self._extract_candidate_names(resume_data)),
+        )
+        if len(self.name_patterns) >= 1000:
+            self.name_patterns.clear()
+        self.name_patterns[resume_data['id']] = (text, patterns)
+        return patterns
+    
+    def _tokenize_all(self, resumes_data: List[Dict], max_tokens: int):
+        """Tokenize every not-yet-seen resume in one multi-threaded tiktoken call"""
+        if self.encoding is None:
+            return
+        unseen = [
+            resume_data for resume_data in resumes_data
+            if (resume_data['id'], max_tokens) not in self.truncated_texts
+        ]
+        if not unseen:
+            return
+        all_token_ids = self.encoding.encode_batch([r['text'] for r in unseen], disallowed_special=())
+        for resume_data, token_ids in zip(unseen, all_token_ids):
+            self._truncation(resume_data, max_tokens, token_ids)
+    
+    def _pack_batches(self, resumes_data: List[Dict], batch_size: int) -> List[List[Dict]]:
+        """Greedily group resumes into chunks of at most batch_size that fit the prompt token budget"""
+        self._tokenize_all(resumes_data, BATCH_RESUME_TOKENS)
+        
+        batches = []
+        current = []
+        current_tokens = 0
+        for resume_data in resumes_data:
+            tokens = self._resume_tokens(resume_data, BATCH_RESUME_TOKENS)
+            if current and (len(current) >= batch_size or current_tokens + tokens > BATCH_PROMPT_TOKEN_BUDGET):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(resume_data)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
     
     def create_batch_prompt(self, resumes_data: List[Dict], customization_settings: Dict) -> str:
         """Create a single prompt for multiple resumes"""
         job_description = customization_settings.get('job_description', '')
         
-        batch_prompt = f"""
-        Analyze the resumes below based on the following job description.
+        parts = [build_prompt_prefix(BATCH_PROMPT_INSTRUCTIONS, job_description, "Resumes to analyze:\n")]
         
-        CRITICAL INSTRUCTIONS:
-        1. DO NOT use generic phrases like "seasoned expert", "proven track record", "perfect fit", "strong background", or any statement that could apply to more than 30% of applicants
-        2. CITE EVIDENCE: For EVERY claim you make, include the EXACT VERBATIM quote from the resume that supports it. Do NOT paraphrase, summarize, or infer - copy the exact words.
-        3. START WITH DIFFERENTIATORS: Begin by identifying what makes each candidate DIFFERENT from typical applicants
-        4. If you cannot find a direct quote to support a claim, do NOT make that claim
-        5. SUBSTANTIVE ACHIEVEMENTS: Focus on achievements with concrete numbers, measurable impact, or significant scope (team size, budget, users affected, percentage improvements, etc.)
-        6. WORK HISTORY: Extract ALL work experiences from the resume (up to 5 maximum). Do NOT arbitrarily limit to 2-3 jobs when more are available.
+        # Duplicate resumes are sent once and referenced by number to save prompt tokens
+        first_seen = {}
+        for i, resume_data in enumerate(resumes_data):
+            content = self._truncate_resume(resume_data, BATCH_RESUME_TOKENS)
+            original = first_seen.setdefault(content, i)
+            if original == i:
+                parts.append(f"\n\nRESUME {i+1}:\nContent: {content}...\n---")
+            else:
+                parts.append(f"\n\nRESUME {i+1}:\nContent: IDENTICAL TO RESUME {original+1}\n---")
         
-        🚨 CRITICAL ANONYMITY REQUIREMENTS 🚨
-        - NEVER mention the candidate's real name, first name, last name, or any personal identifiers
-        - NEVER use pronouns that reveal gender (he/him, she/her) - use "they/them" or avoid pronouns entirely
-        - NEVER start summaries with names like "John is..." or "Sarah has..." 
-        - Use role-based descriptions: "This candidate...", "The applicant...", "This professional..."
-        - Keep the focus on skills, experience, and achievements - NOT personal identity
-        - Examples of GOOD openings: "Experienced software engineer with...", "Seasoned marketing professional who...", "Technical leader specializing in..."
-        - Examples of BAD openings: "John is a software engineer...", "Sarah brings 5 years...", "Michael has experience..."
+        if len(first_seen) < len(resumes_data):
+            parts.append(f"\n\nReturn exactly {len(resumes_data)} objects, one per resume in order, including resumes marked identical.")
+        parts.append("\n\nRemember: Return ONLY the JSON array, no other text. Ensure valid JSON syntax.")
         
-        ⚠️  CRITICAL JSON FORMATTING REQUIREMENTS ⚠️
-        - You MUST return ONLY a valid JSON array
-        - Do NOT include any text before or after the JSON
-        - Do NOT wrap in markdown code blocks (no ```json or ```)
-        - Do NOT include any explanatory text
-        - Ensure all strings are properly escaped with double quotes
-        - Ensure all arrays and objects have proper comma separation
-        - Test your JSON mentally before responding to ensure it's valid
+        return "".join(parts)
+    
+    def _request_kwargs(self, timeout: Optional[float], resume_count: int = 1, json_object: bool = False) -> Dict:
+        """LLM call options: the output cap for resume_count analyses, the timeout when set, and
+        JSON mode for prompts whose reply is a single object"""
+        kwargs = {}
+        if self.max_output_tokens:
+            kwargs['max_tokens'] = self.max_output_tokens * resume_count
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+        if json_object and self.json_mode:
+            kwargs['response_format'] = {'type': 'json_object'}
+        return kwargs
+    
+    def _chat(self, prompt: str, timeout: Optional[float] = None) -> str:
+        """Send a single-resume prompt to the LLM, passing the request timeout through when set"""
+        kwargs = self._request_kwargs(timeout, json_object=True)
+        for attempt in range(LLM_RETRY_ATTEMPTS):
+            self.rate_limiter.wait()
+            try:
+                return self.llm_service.chat(prompt, **kwargs)
+            except Exception as e:
+                if attempt == LLM_RETRY_ATTEMPTS - 1 or not is_transient_llm_error(e):
+                    raise
+                logger.warning("Transient LLM error, retrying: %s", e)
+                time.sleep(retry_delay(attempt))
+    
+    async def _achat(self, prompt: str, timeout: Optional[float] = None) -> str:
+        """Async counterpart of _chat"""
+        kwargs = self._request_kwargs(timeout, json_object=True)
+        for attempt in range(LLM_RETRY_ATTEMPTS):
+            await self.rate_limiter.wait_async()
+            try:
+                return await self.llm_service.achat(prompt, **kwargs)
+            except Exception as e:
+                if attempt == LLM_RETRY_ATTEMPTS - 1 or not is_transient_llm_error(e):
+                    raise
+                logger.warning("Transient LLM error, retrying: %s", e)
+                await asyncio.sleep(retry_delay(attempt))
+    
+    def _stream_batch(self, batch: List[Dict], prompt: str, timeout: Optional[float] = None) -> Dict[str, Dict]:
+        """Stream a batch reply, normalizing each resume's result as soon as its JSON object closes.
         
-        Return a JSON array, with each object containing these exact keys:
+        timeout bounds the whole reply, not just the gap between chunks, so a reply that
+        keeps trickling tokens is still cut off (TimeoutError).
+        """
+        kwargs = self._request_kwargs(timeout, len(batch))
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        
+        for attempt in range(LLM_RETRY_ATTEMPTS):
+            self.rate_limiter.wait()
+            parser = JsonArrayStream()
+            parts = []
+            results = {}
+            element_index = 0
+            try:
+                for chunk in self.llm_service.chat_stream(prompt, **kwargs):
+                    if deadline is not None and time.monotonic() > deadline:
+                        raise TimeoutError(f"Batch reply still streaming after {timeout} seconds")
+                    parts.append(chunk)
+                    for element in parser.feed(chunk):
+                        if element_index < len(batch):
+                            self._add_batch_element(results, batch[element_index], element)
+                        element_index += 1
+                break
+            except Exception as e:
+                # A half-streamed reply keeps the elements that already closed; the rest of
+                # the batch is reprocessed individually. Timeouts still go to the caller.
+                if parts and not isinstance(e, TimeoutError):
+                    logger.warning("Batch stream failed after %s of %s results, salvaging: %s", len(results), len(batch), e)
+                    break
+                # Only retry before anything arrived
+                if parts or attempt == LLM_RETRY_ATTEMPTS - 1 or not is_transient_llm_error(e):
+                    raise
+                logger.warning("Transient LLM error, retrying: %s", e)
+                time.sleep(retry_delay(attempt))
+        
+        return self._finish_streamed_batch(batch, results, parts)
+    
+    async def _stream_batch_async(self, batch: List[Dict], prompt: str, timeout: Optional[float] = None) -> Dict[str, Dict]:
+        """Async counterpart of _stream_batch"""
+        kwargs = self._request_kwargs(timeout, len(batch))
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        
+        for attempt in range(LLM_RETRY_ATTEMPTS):
+            await self.rate_limiter.wait_async()
+            parser = JsonArrayStream()
+            parts = []
+            results = {}
+            element_index = 0
+            try:
+                async for chunk in self.llm_service.achat_stream(prompt, **kwargs):
+                    if deadline is not None and time.monotonic() > deadline:
+                        raise TimeoutError(f"Batch reply still streaming after {timeout} seconds")
+                    parts.append(chunk)
+                    for element in parser.feed(chunk):
+                        if element_index < len(batch):
+                            self._add_batch_element(results, batch[element_index], element)
+                        element_index += 1
+                break
+            except Exception as e:
+                if parts and not isinstance(e, TimeoutError):
+                    logger.warning("Batch stream failed after %s of %s results, salvaging: %s", len(results), len(batch), e)
+                    break
+                if parts or attempt == LLM_RETRY_ATTEMPTS - 1 or not is_transient_llm_error(e):
+                    raise
+                logger.warning("Transient LLM error, retrying: %s", e)
+                await asyncio.sleep(retry_delay(attempt))
+        
+        return self._finish_streamed_batch(batch, results, parts)
+    
+    def _finish_streamed_batch(self, batch: List[Dict], results: Dict[str, Dict], parts: List[str]) -> Dict[str, Dict]:
+        """Fall back to whole-response parsing when streaming didn't yield an element per resume"""
+        if len(results) == len(batch):
+            return results
         
-        - "differentiators": An array of 3 things that make this candidate UNIQUE compared to typical applicants for this role. Each item should be an object with:
-          - "claim": The unique aspect (be specific, not generic, and CONCISE - avoid filler words like "effectively", "successfully", "efficiently")
-          - "evidence": The EXACT VERBATIM quote from the resume (copy word-for-word, no paraphrasing)
+        response = "".join(parts)
+        try:
+            return self._map_batch_response(batch, response)
+        except (json.JSONDecodeError, ValueError) as e:
+            logger.warning("Batch JSON parsing failed: %s", e)
+            logger.warning("Raw batch response preview: %s...", response[:300])
+            return results
+    
+    def _add_batch_element(self, results: Dict[str, Dict], resume_data: Dict, element: str):
+        """Parse one array element of a batch reply into results, skipping it if it can't be repaired"""
+        candidates = [element, self._fix_common_json_issues(element)]
+        for text in candidates:
+            try:
+                result = _json_loads(text)
+                break
+            except ValueError:
+                continue
+        else:
+            if repair_json is None:
+                return
+            try:
+                result = _json_loads(repair_json(element))
+            except ValueError:
+                return
+        
+        if not isinstance(result, dict) or not REQUIRED_SUMMARY_KEYS.issubset(result):
+            # Not an analysis (e.g. a stray nested object); the resume is reprocessed on its own
+            return
+        results[resume_data['id']] = self._normalize_batch_result(result)
+    
+    def _build_single_prompt(self, resume_data: Dict, customization_settings: Dict) -> str:
+        """Build the regular single-resume analysis prompt"""
+        job_description = customization_settings.get('job_description', '')
         
-        - "nickname": A 2-3 word nickname based on their UNIQUE profile (e.g., "Quantum Researcher", "Startup Veteran", "Patent Holder"). NO generic terms like "Tech Expert"
+        return "".join([
+            build_prompt_prefix(SINGLE_PROMPT_INSTRUCTIONS, job_description, "Resume to analyze:\n"),
+            self._truncate_resume(resume_data, SINGLE_RESUME_TOKENS),
+            "...\n\nRemember: Return ONLY the JSON object, no other text. Ensure valid JSON syntax.\n",
+        ])
+    
+    def _build_enhanced_formatting_prompt(self, resume_data: Dict, customization_settings: Dict) -> str:
+        """Build the stricter prompt used after a response had formatting issues"""
+        job_description = customization_settings.get('job_description', '')
+        last_response = resume_data.get('_last_response', {})
+        quality_info = last_response.get('_quality_info', {})
         
-        - "summary": A brief 1-2 line summary focusing on SPECIFIC experiences and achievements, not generic qualities
+        logger.info("🔧 Retrying %s with enhanced formatting instructions", resume_data.get('name', 'unknown'))
+        logger.info("   Previous issues: %s", quality_info.get('details', []))
+        
+        # Per-resume details go after the cached instructions + job description prefix
+        return "".join([
+            build_prompt_prefix(ENHANCED_FORMATTING_INSTRUCTIONS, job_description, "Previous formatting issues detected:\n"),
+            ', '.join(quality_info.get('details', [])),
+            "\n\nResume Content:\n",
+            self._truncate_resume(resume_data, ENHANCED_RESUME_TOKENS),
+            "...\n\nOutput ONLY the JSON object. No other text.\n",
+        ])
+    
+    def _build_json_retry_prompt(self, resume_data: Dict, customization_settings: Dict, original_response: str) -> str:
+        """Build the prompt that asks the LLM to re-emit an unparseable response as JSON"""
+        job_description = customization_settings.get('job_description', '')
         
-        - "reservations": An array of 2-3 SPECIFIC concerns or gaps for this specific role (focus on what's missing or lacking, no evidence quotes needed for gaps)
+        return "".join([
+            build_prompt_prefix(JSON_RETRY_INSTRUCTIONS, job_description, "Resume:\n"),
+            self._truncate_resume(resume_data, JSON_RETRY_RESUME_TOKENS),
+            "...\n\nOriginal content that needs to be in JSON format:\n",
+            original_response[:1000],
+            "...\n",
+        ])
+    
+    def _clean_result(self, resume_data: Dict, response: str) -> Dict:
+        """Parse a single-resume response, fill in missing fields and scrub identifiers"""
+        result = self._parse_json_response(response)
+        
+        # Validate and scrub in one go: names that slipped through are removed from the
+        # normalized fields before they are flattened back into the result dict
+        analysis = ResumeAnalysis.from_dict(result)
+        return self._scrub_personal_identifiers(analysis, resume_data).to_dict()
+    
+    def _finalize_single_response(self, resume_data: Dict, response: str) -> Dict:
+        """Turn a regular single-resume response into a result; raises json.JSONDecodeError if unparseable"""
+        result = self._clean_result(resume_data, response)
         
-        - "relevant_achievements": An array of exactly 4 SUBSTANTIVE, QUANTIFIED achievements that directly relate to this role. Each should be an object with:
-          - "achievement": A specific, impactful accomplishment with numbers/metrics that shows capability for this role
-          - "evidence": The EXACT VERBATIM quote from resume (copy word-for-word)
+        # Check if this is a quality response or just fallback data
+        response_quality = self._assess_response_quality(result, resume_data, response)
         
-        - "wildcard": An object with:
-          - "fact": A unique, interesting aspect that likely wouldn't appear in other resumes
-          - "evidence": The EXACT VERBATIM quote supporting this (copy word-for-word)
+        if response_quality['is_low_quality']:
+            logger.warning("⚠️ Low quality response detected for %s: %s", resume_data.get('name', 'unknown'), response_quality['reason'])
+            
+            # This is a formatting failure, not an API failure
+            return self._create_formatting_failure_response(resume_data, response, response_quality)
         
-        - "work_history": An array of work experiences. IMPORTANT: Extract ALL available work experiences from the resume, up to a maximum of 5. If the resume shows 5+ jobs, include all 5. If it shows 4 jobs, include all 4. Do NOT limit to just 2-3 entries. Each should be an object with "title", "company", and "years". Order from most recent to oldest.
+        return result
+    
+    def _finalize_enhanced_response(self, resume_data: Dict, response: str) -> Dict:
+        """Turn an enhanced-formatting retry response into a result"""
+        result = self._clean_result(resume_data, response)
         
-        - "experience_distribution": An object with years in different sectors: {{"corporate": 0, "startup": 0, "nonprofit": 0, "government": 0, "education": 0, "other": 0}}
-
-        EXAMPLE JSON STRUCTURE (adapt to actual resume content):
-        [
-          {{
-            "differentiators": [
-              {{"claim": "Holder of 15 AI patents", "evidence": "Invented and patented 15 machine learning algorithms"}},
-              {{"claim": "Led 200-person engineering org", "evidence": "VP Engineering managing 200+ engineers across 12 teams"}},
-              {{"claim": "Scaled systems to 50M users", "evidence": "Architected platform serving 50 million daily active users"}}
-            ],
-            "nickname": "AI Patent Holder",
-            "summary": "VP Engineering with 15 AI patents who scaled platforms to 50M users and managed 200+ person teams.",
-            "reservations": ["No direct fintech experience", "May be overqualified for IC role"],
-            "relevant_achievements": [
-              {{"achievement": "Reduced infrastructure costs by 40%", "evidence": "Led cloud migration saving $2M annually"}},
-              {{"achievement": "Improved system uptime to 99.9%", "evidence": "Achieved 99.9% uptime across all services"}},
-              {{"achievement": "Launched product used by 10M users", "evidence": "Shipped recommendation engine to 10M+ users"}},
-              {{"achievement": "Built team from 20 to 200 engineers", "evidence": "Grew engineering org from 20 to 200 in 2 years"}}
-            ],
-            "wildcard": {{"fact": "Published research in Nature", "evidence": "Co-authored paper on quantum computing in Nature journal"}},
-            "work_history": [
-              {{"title": "VP Engineering", "company": "TechCorp", "years": "2020-2024"}},
-              {{"title": "Senior Director", "company": "StartupXYZ", "years": "2018-2020"}},
-              {{"title": "Engineering Manager", "company": "BigTech", "years": "2015-2018"}}
-            ],
-            "experience_distribution": {{"corporate": 6, "startup": 3, "nonprofit": 0, "government": 0, "education": 0, "other": 0}}
-          }}
-        ]
-
-        Job Description:
-        {job_description if job_description else "Not provided."}
-
-        Resumes to analyze:
-        """
+        # Validate quality again
+        response_quality = self._assess_response_quality(result, resume_data, response)
         
-        for i, resume_data in enumerate(resumes_data):
-            batch_prompt += f"\n\nRESUME {i+1} (ID: {resume_data['id']}):\n"
-            batch_prompt += f"Content: {resume_data['text'][:8000]}...\n"  # Increased for full resume content
-            batch_prompt += "---"
+        if response_quality['is_low_quality']:
+            logger.error("❌ Enhanced formatting retry still failed for %s", resume_data.get('name', 'unknown'))
+            return self._create_formatting_failure_response(resume_data, response, response_quality)
         
-        batch_prompt += "\n\nRemember: Return ONLY the JSON array, no other text. Ensure valid JSON syntax."
+        logger.info("✅ Enhanced formatting retry succeeded for %s", resume_data.get('name', 'unknown'))
+        return result
+    
+    def _finalize_json_retry_response(self, resume_data: Dict, response: str) -> Dict:
+        """Turn a JSON-focused retry response into a result"""
+        result = self._parse_json_response(response)
+        result = self._validate_and_fix_result_structure(result)
         
-        return batch_prompt
+        logger.info("✅ Retry successful for %s", resume_data.get('name', 'unknown'))
+        return result
+    
+    def _json_failure_response(self, resume_data: Dict, response: str, error: Exception) -> Dict:
+        """Formatting failure for a response that stayed unparseable after the JSON retry"""
+        return self._create_formatting_failure_response(resume_data, response, {
+            'is_low_quality': True,
+            'reason': 'JSON parsing failed',
+            'details': str(error)
+        })
+    
+    def _enhanced_retry_failure_response(self, resume_data: Dict, error: Exception) -> Dict:
+        """Formatting failure for an enhanced-formatting retry that raised"""
+        logger.error("❌ Enhanced formatting retry failed for %s: %s", resume_data.get('name', 'unknown'), error)
+        return self._create_formatting_failure_response(resume_data, str(error), {
+            'is_low_quality': True,
+            'reason': 'Enhanced retry failed',
+            'details': [str(error)]
+        })
     
-    def process_single_resume(self, resume_data: Dict, customization_settings: Dict) -> Dict:
+    def process_single_resume(self, resume_data: Dict, customization_settings: Dict, timeout: Optional[float] = None) -> Dict:
         """Process a single resume (fallback method)"""
-        job_description = customization_settings.get('job_description', '')
-        
         # Check if this is a formatting retry
-        is_formatting_retry = '_last_response' in resume_data
-        
-        if is_formatting_retry:
+        if '_last_response' in resume_data:
             # Use enhanced formatting instructions for retry
-            return self._process_with_enhanced_formatting(resume_data, customization_settings)
-        
-        # Regular processing
-        prompt = f"""
-        Analyze this resume based on the job description below.
-        
-        CRITICAL INSTRUCTIONS:
-        1. DO NOT use generic phrases like "seasoned expert", "proven track record", "perfect fit", "strong background", or any statement that could apply to more than 30% of applicants
-        2. CITE EVIDENCE: For EVERY claim you make, include the EXACT VERBATIM quote from the resume that supports it. Do NOT paraphrase, summarize, or infer - copy the exact words.
-        3. START WITH DIFFERENTIATORS: Begin by identifying what makes this candidate DIFFERENT from typical applicants
-        4. If you cannot find a direct quote to support a claim, do NOT make that claim
-        5. SUBSTANTIVE ACHIEVEMENTS: Focus on achievements with concrete numbers, measurable impact, or significant scope (team size, budget, users affected, percentage improvements, etc.)
-        6. WORK HISTORY: Extract ALL work experiences from the resume (up to 5 maximum). Do NOT arbitrarily limit to 2-3 jobs when more are available.
-        
-        🚨 CRITICAL ANONYMITY REQUIREMENTS 🚨
-        - NEVER mention the candidate's real name, first name, last name, or any personal identifiers
-        - NEVER use pronouns that reveal gender (he/him, she/her) - use "they/them" or avoid pronouns entirely
-        - NEVER start summaries with names like "John is..." or "Sarah has..." 
-        - Use role-based descriptions: "This candidate...", "The applicant...", "This professional..."
-        - Keep the focus on skills, experience, and achievements - NOT personal identity
-        - Examples of GOOD openings: "Experienced software engineer with...", "Seasoned marketing professional who...", "Technical leader specializing in..."
-        - Examples of BAD openings: "John is a software engineer...", "Sarah brings 5 years...", "Michael has experience..."
-        
-        ⚠️  CRITICAL JSON FORMATTING REQUIREMENTS ⚠️
-        - You MUST return ONLY a valid JSON object
-        - Do NOT include any text before or after the JSON
-        - Do NOT wrap in markdown code blocks (no ```json or ```)
-        - Do NOT include any explanatory text
-        - Ensure all strings are properly escaped with double quotes
-        - Ensure all arrays and objects have proper comma separation
-        - Test your JSON mentally before responding to ensure it's valid
-        
-        Return a JSON object with these exact keys:
-        
-        - "differentiators": An array of 3 things that make this candidate UNIQUE compared to typical applicants for this role. Each item should be an object with:
-          - "claim": The unique aspect (be specific, not generic, and CONCISE - avoid filler words like "effectively", "successfully", "efficiently")
-          - "evidence": The EXACT VERBATIM quote from the resume (copy word-for-word, no paraphrasing)
-        
-        - "nickname": A 2-3 word nickname based on their UNIQUE profile (e.g., "Quantum Researcher", "Startup Veteran", "Patent Holder"). NO generic terms like "Tech Expert"
-        
-        - "summary": A brief 2-3 line summary focusing on SPECIFIC experiences and achievements, not generic qualities
-        
-        - "reservations": An array of 2-3 SPECIFIC concerns or gaps for this specific role (focus on what's missing or lacking, no evidence quotes needed for gaps)
-        
-        - "relevant_achievements": An array of exactly 4 SUBSTANTIVE, QUANTIFIED achievements that directly relate to this role. Each should be an object with:
-          - "achievement": A specific, impactful accomplishment with numbers/metrics that shows capability for this role
-          - "evidence": The EXACT VERBATIM quote from resume (copy word-for-word)
-        
-        - "wildcard": An object with:
-          - "fact": A unique, interesting aspect that likely wouldn't appear in other resumes
-          - "evidence": The EXACT VERBATIM quote supporting this (copy word-for-word)
-        
-        - "work_history": An array of work experiences. IMPORTANT: Extract ALL available work experiences from the resume, up to a maximum of 5. If the resume shows 5+ jobs, include all 5. If it shows 4 jobs, include all 4. Do NOT limit to just 2-3 entries. Each should be an object with "title", "company", and "years". Order from most recent to oldest.
-        
-        - "experience_distribution": An object with years in different sectors: {{"corporate": 0, "startup": 0, "nonprofit": 0, "government": 0, "education": 0, "other": 0}}
-
-        EXAMPLE JSON STRUCTURE (adapt to actual resume content):
-        {{
-          "differentiators": [
-            {{"claim": "Holder of 15 AI patents", "evidence": "Invented and patented 15 machine learning algorithms"}},
-            {{"claim": "Led 200-person engineering org", "evidence": "VP Engineering managing 200+ engineers across 12 teams"}},
-            {{"claim": "Scaled systems to 50M users", "evidence": "Architected platform serving 50 million daily active users"}}
-          ],
-          "nickname": "AI Patent Holder",
-          "summary": "VP Engineering with 15 AI patents who scaled platforms to 50M users and managed 200+ person teams.",
-          "reservations": ["No direct fintech experience", "May be overqualified for IC role"],
-          "relevant_achievements": [
-            {{"achievement": "Reduced infrastructure costs by 40%", "evidence": "Led cloud migration saving $2M annually"}},
-            {{"achievement": "Improved system uptime to 99.9%", "evidence": "Achieved 99.9% uptime across all services"}},
-            {{"achievement": "Launched product used by 10M users", "evidence": "Shipped recommendation engine to 10M+ users"}},
-            {{"achievement": "Built team from 20 to 200 engineers", "evidence": "Grew engineering org from 20 to 200 in 2 years"}}
-          ],
-          "wildcard": {{"fact": "Published research in Nature", "evidence": "Co-authored paper on quantum computing in Nature journal"}},
-          "work_history": [
-            {{"title": "VP Engineering", "company": "TechCorp", "years": "2020-2024"}},
-            {{"title": "Senior Director", "company": "StartupXYZ", "years": "2018-2020"}},
-            {{"title": "Engineering Manager", "company": "BigTech", "years": "2015-2018"}}
-          ],
-          "experience_distribution": {{"corporate": 6, "startup": 3, "nonprofit": 0, "government": 0, "education": 0, "other": 0}}
-        }}
-
-        Job Description:
-        {job_description if job_description else "Not provided."}
-        
-        Resume to analyze:
-        {resume_data['text'][:12000]}...
-        
-        Remember: Return ONLY the JSON object, no other text. Ensure valid JSON syntax.
-        """
+            return self._process_with_enhanced_formatting(resume_data, customization_settings, timeout)
+        
+        prompt = self._build_single_prompt(resume_data, customization_settings)
         
         try:
-            response = self.llm_service.chat(prompt)
-            
-            # Track API success but potential formatting failure
-            api_success = True
-            raw_response = response
+            response = self._chat(prompt, timeout)
             
-            # Try to parse JSON response
             try:
-                # Enhanced JSON cleaning and parsing
-                result = self._parse_json_response(response)
-                
-                # Ensure all required fields are present with proper structure
-                result = self._validate_and_fix_result_structure(result)
-                
-                # NEW: Scrub any names that slipped through
-                result = self._scrub_personal_identifiers(result, resume_data)
-                
-                # NEW: Check if this is a quality response or just fallback data
-                response_quality = self._assess_response_quality(result, resume_data, raw_response)
-                
-                if response_quality['is_low_quality']:
-                    print(f"⚠️ Low quality response detected for {resume_data.get('name', 'unknown')}: {response_quality['reason']}")
-                    
-                    # This is a formatting failure, not an API failure
-                    return self._create_formatting_failure_response(resume_data, raw_response, response_quality)
-                
-                return result
-                
+                return self._finalize_single_response(resume_data, response)
             except json.JSONDecodeError as e:
-                print(f"JSON parsing failed for {resume_data.get('name', 'unknown')}: {e}")
-                print(f"Raw response preview: {response[:300]}...")
+                logger.warning("JSON parsing failed for %s: %s", resume_data.get('name', 'unknown'), e)
+                logger.warning("Raw response preview: %s...", response[:300])
                 
                 # Try one retry with explicit JSON formatting instructions
-                retry_result = self._retry_with_json_focus(resume_data, customization_settings, response)
+                retry_result = self._retry_with_json_focus(resume_data, customization_settings, response, timeout)
                 if retry_result:
                     return retry_result
                 
                 # This is a formatting failure, not an API failure
-                return self._create_formatting_failure_response(resume_data, response, {
-                    'is_low_quality': True,
-                    'reason': 'JSON parsing failed',
-                    'details': str(e)
-                })
+                return self._json_failure_response(resume_data, response, e)
                 
+        except TimeoutError:
+            # Let the caller route this to the timeout retry queue
+            raise
         except Exception as e:
             # This is likely an API failure (connection, timeout, etc.)
-            print(f"LLM API error processing resume for {resume_data['name']}: {e}")
+            logger.error("LLM API error processing resume for %s: %s", resume_data['name'], e)
             return self._create_error_response()
     
-    def _process_with_enhanced_formatting(self, resume_data: Dict, customization_settings: Dict) -> Dict:
-        """Process resume with enhanced formatting instructions for retry attempts"""
-        job_description = customization_settings.get('job_description', '')
-        last_response = resume_data.get('_last_response', {})
-        quality_info = last_response.get('_quality_info', {})
+    async def process_single_resume_async(self, resume_data: Dict, customization_settings: Dict, timeout: Optional[float] = None) -> Dict:
+        """Async counterpart of process_single_resume"""
+        if '_last_response' in resume_data:
+            return await self._process_with_enhanced_formatting_async(resume_data, customization_settings, timeout)
         
-        print(f"🔧 Retrying {resume_data.get('name', 'unknown')} with enhanced formatting instructions")
-        print(f"   Previous issues: {quality_info.get('details', [])}")
-        
-        enhanced_prompt = f"""
-        CRITICAL: The previous attempt failed due to formatting issues. You MUST follow these requirements exactly.
-        
-        🚨 MANDATORY JSON OUTPUT FORMAT 🚨
-        - Your response must be ONLY a JSON object
-        - Start with {{ and end with }}
-        - NO text before the JSON
-        - NO text after the JSON  
-        - NO markdown code blocks (```json or ```)
-        - NO explanations or comments
-        - Use double quotes for ALL strings
-        - Ensure proper comma placement
-        
-        Previous formatting issues detected:
-        {', '.join(quality_info.get('details', []))}
-        
-        Task: Analyze this resume and return a properly formatted JSON object.
-        
-        Required JSON structure (fill with actual content from resume):
-        {{
-          "differentiators": [
-            {{"claim": "Specific unique aspect", "evidence": "Exact quote from resume"}},
-            {{"claim": "Another unique aspect", "evidence": "Another exact quote"}},
-            {{"claim": "Third unique aspect", "evidence": "Third exact quote"}}
-          ],
-          "nickname": "Specific Role Name",
-          "summary": "Brief summary with specific achievements and experience",
-          "reservations": ["Specific concern 1", "Specific concern 2"],
-          "relevant_achievements": [
-            {{"achievement": "Quantified achievement", "evidence": "Exact quote"}},
-            {{"achievement": "Another quantified achievement", "evidence": "Another quote"}},
-            {{"achievement": "Third quantified achievement", "evidence": "Third quote"}},
-            {{"achievement": "Fourth quantified achievement", "evidence": "Fourth quote"}}
-          ],
-          "wildcard": {{"fact": "Unique interesting fact", "evidence": "Exact supporting quote"}},
-          "work_history": [
-            {{"title": "Job Title", "company": "Company Name", "years": "2020-2024"}},
-            {{"title": "Previous Title", "company": "Previous Company", "years": "2018-2020"}}
-          ],
-          "experience_distribution": {{"corporate": 0, "startup": 0, "nonprofit": 0, "government": 0, "education": 0, "other": 0}}
-        }}
-        
-        Job Description: {job_description if job_description else "Not provided."}
-        
-        Resume Content:
-        {resume_data['text'][:10000]}...
-        
-        Output ONLY the JSON object. No other text.
-        """
+        prompt = self._build_single_prompt(resume_data, customization_settings)
         
         try:
-            response = self.llm_service.chat(enhanced_prompt)
-            
-            # Parse with enhanced validation
-            result = self._parse_json_response(response)
-            result = self._validate_and_fix_result_structure(result)
-            
-            # Scrub any names that slipped through
-            result = self._scrub_personal_identifiers(result, resume_data)
-            
-            # Validate quality again
-            response_quality = self._assess_response_quality(result, resume_data, response)
-            
-            if response_quality['is_low_quality']:
-                print(f"❌ Enhanced formatting retry still failed for {resume_data.get('name', 'unknown')}")
-                return self._create_formatting_failure_response(resume_data, response, response_quality)
-            
-            print(f"✅ Enhanced formatting retry succeeded for {resume_data.get('name', 'unknown')}")
-            return result
+            response = await self._achat(prompt, timeout)
             
+            try:
+                return self._finalize_single_response(resume_data, response)
+            except json.JSONDecodeError as e:
+                logger.warning("JSON parsing failed for %s: %s", resume_data.get('name', 'unknown'), e)
+                logger.warning("Raw response preview: %s...", response[:300])
+                
+                retry_result = await self._retry_with_json_focus_async(resume_data, customization_settings, response, timeout)
+                if retry_result:
+                    return retry_result
+                
+                return self._json_failure_response(resume_data, response, e)
+                
+        except TimeoutError:
+            raise
+        except Exception as e:
+            logger.error("LLM API error processing resume for %s: %s", resume_data['name'], e)
+            return self._create_error_response()
+    
+    def _process_with_enhanced_formatting(self, resume_data: Dict, customization_settings: Dict, timeout: Optional[float] = None) -> Dict:
+        """Process resume with enhanced formatting instructions for retry attempts"""
+        enhanced_prompt = self._build_enhanced_formatting_prompt(resume_data, customization_settings)
+        
+        try:
+            response = self._chat(enhanced_prompt, timeout)
+            return self._finalize_enhanced_response(resume_data, response)
+        except TimeoutError:
+            raise
         except Exception as e:
-            print(f"❌ Enhanced formatting retry failed for {resume_data.get('name', 'unknown')}: {e}")
-            return self._create_formatting_failure_response(resume_data, str(e), {
-                'is_low_quality': True,
-                'reason': 'Enhanced retry failed',
-                'details': [str(e)]
-            })
-    
-    def _retry_with_json_focus(self, resume_data: Dict, customization_settings: Dict, original_response: str) -> Dict:
+            return self._enhanced_retry_failure_response(resume_data, e)
+    
+    async def _process_with_enhanced_formatting_async(self, resume_data: Dict, customization_settings: Dict, timeout: Optional[float] = None) -> Dict:
+        """Async counterpart of _process_with_enhanced_formatting"""
+        enhanced_prompt = self._build_enhanced_formatting_prompt(resume_data, customization_settings)
+        
+        try:
+            response = await self._achat(enhanced_prompt, timeout)
+            return self._finalize_enhanced_response(resume_data, response)
+        except TimeoutError:
+            raise
+        except Exception as e:
+            return self._enhanced_retry_failure_response(resume_data, e)
+    
+    def _retry_with_json_focus(self, resume_data: Dict, customization_settings: Dict, original_response: str, timeout: Optional[float] = None) -> Dict:
         """Retry with focused JSON formatting instructions"""
         try:
-            job_description = customization_settings.get('job_description', '')
-            
-            retry_prompt = f"""
-            The previous response was not valid JSON. Please analyze this resume and return ONLY a properly formatted JSON object.
-            
-            STRICT JSON REQUIREMENTS:
-            - Return ONLY JSON - no explanations, no markdown, no extra text
-            - Use proper JSON syntax with double quotes for all strings
-            - Ensure proper comma placement and bracket matching
-            - Do not include any text before or after the JSON object
-            
-            Original content that needs to be in JSON format:
-            {original_response[:1000]}...
-            
-            Resume: {resume_data['text'][:8000]}...
-            Job Description: {job_description if job_description else "Not provided."}
-            
-            Return a valid JSON object with these keys: differentiators, nickname, summary, reservations, relevant_achievements, wildcard, work_history, experience_distribution
-            """
-            
-            retry_response = self.llm_service.chat(retry_prompt)
-            result = self._parse_json_response(retry_response)
-            result = self._validate_and_fix_result_structure(result)
-            
-            print(f"✅ Retry successful for {resume_data.get('name', 'unknown')}")
-            return result
-            
+            retry_prompt = self._build_json_retry_prompt(resume_data, customization_settings, original_response)
+            retry_response = self._chat(retry_prompt, timeout)
+            return self._finalize_json_retry_response(resume_data, retry_response)
+        except TimeoutError:
+            raise
+        except Exception as e:
+            logger.error("❌ Retry also failed for %s: %s", resume_data.get('name', 'unknown'), e)
+            return None
+    
+    async def _retry_with_json_focus_async(self, resume_data: Dict, customization_settings: Dict, original_response: str, timeout: Optional[float] = None) -> Dict:
+        """Async counterpart of _retry_with_json_focus"""
+        try:
+            retry_prompt = self._build_json_retry_prompt(resume_data, customization_settings, original_response)
+            retry_response = await self._achat(retry_prompt, timeout)
+            return self._finalize_json_retry_response(resume_data, retry_response)
+        except TimeoutError:
+            raise
         except Exception as e:
-            print(f"❌ Retry also failed for {resume_data.get('name', 'unknown')}: {e}")
+            logger.error("❌ Retry also failed for %s: %s", resume_data.get('name', 'unknown'), e)
             return None
     
     def _parse_json_response(self, response: str) -> Dict:
         """Enhanced JSON parsing with multiple cleaning strategies"""
-        if not response or not response.strip():
+        stripped = response.strip() if response else ''
+        if not stripped:
             raise json.JSONDecodeError("Empty response", "", 0)
         
-        # Strategy 1: Direct parsing (try first)
-        try:
-            return json.loads(response.strip())
-        except json.JSONDecodeError:
-            pass
-        
-        # Strategy 2: Remove markdown code blocks
-        clean_response = response.strip()
-        
-        # Remove various markdown block patterns
-        patterns_to_remove = [
-            r'^```json\s*',  # ```json at start
-            r'^```\s*',      # ``` at start
-            r'\s*```$',      # ``` at end
-            r'^json\s*',     # standalone "json" at start
-        ]
-        
-        for pattern in patterns_to_remove:
-            clean_response = re.sub(pattern, '', clean_response, flags=re.MULTILINE)
-        
-        # Try parsing after markdown removal
-        try:
-            return json.loads(clean_response.strip())
-        except json.JSONDecodeError:
-            pass
-        
-        # Strategy 3: Find JSON within the response
-        # Look for content between first { and last }
-        start_idx = clean_response.find('{')
-        end_idx = clean_response.rfind('}')
-        
-        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-            json_content = clean_response[start_idx:end_idx + 1]
+        # Pick the one decode attempt the first character points to, instead of
+        # raising and catching through every strategy in turn
+        first = stripped[0]
+        if first in '{[':
+            # Strategy 1: bare JSON, the common case
+            clean_response = stripped
+        elif first == '`' or stripped.startswith('json'):
+            # Strategy 2: markdown-fenced JSON
+            clean_response = clean_llm_json(stripped)
+        else:
+            # Prose around the JSON: go straight to extraction
+            clean_response = None
+        
+        if clean_response is not None:
             try:
-                return json.loads(json_content)
+                return loads_llm_json(clean_response)
             except json.JSONDecodeError:
                 pass
+        else:
+            clean_response = stripped
         
-        # Strategy 4: Look for array pattern if it's a batch response
-        start_idx = clean_response.find('[')
-        end_idx = clean_response.rfind(']')
-        
-        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-            json_content = clean_response[start_idx:end_idx + 1]
-            try:
-                return json.loads(json_content)
-            except json.JSONDecodeError:
-                pass
+        # Strategy 3: Carve a complete top-level object/array out of surrounding text, repairing
+        # each span as a whole before moving on, and skipping bracketed prose that doesn't parse
+        for candidate in iter_json_values(clean_response):
+            for attempt in (candidate, self._fix_common_json_issues(candidate)):
+                try:
+                    return _json_loads(attempt)
+                except json.JSONDecodeError:
+                    pass
+        
+        # Strategy 3b: Outermost braces, then outermost brackets, for values the scan can't close
+        for opener, closer in (('{', '}'), ('[', ']')):
+            start_idx = clean_response.find(opener)
+            end_idx = clean_response.rfind(closer)
+            if start_idx != -1 and end_idx > start_idx:
+                try:
+                    return _json_loads(clean_response[start_idx:end_idx + 1])
+                except json.JSONDecodeError:
+                    pass
         
-        # Strategy 5: Try fixing common JSON issues
+        # Strategy 4: Try fixing common JSON issues across the whole reply
         fixed_response = self._fix_common_json_issues(clean_response)
         try:
-            return json.loads(fixed_response)
+            return _json_loads(fixed_response)
         except json.JSONDecodeError:
             pass
         
@@ -446,115 +1188,61 @@ class BatchProcessor:
     
     def _fix_common_json_issues(self, response: str) -> str:
         """Fix common JSON formatting issues"""
-        # Fix unescaped quotes in strings
-        # This is a simple fix - might need more sophisticated handling
-        fixed = response
-        
-        # Fix trailing commas before closing braces/brackets
-        fixed = re.sub(r',(\s*[}\]])', r'\1', fixed)
-        
-        # Fix missing commas between array/object elements (basic patterns)
-        fixed = re.sub(r'}\s*{', r'},{', fixed)  # Between objects
-        fixed = re.sub(r']\s*\[', r'],[', fixed)  # Between arrays
-        
-        return fixed
+        # Drop trailing commas before closing braces/brackets and add missing
+        # commas between adjacent objects/arrays in a single scan
+        return JSON_REPAIR_RE.sub(_repair_json_match, response)
     
     def _validate_and_fix_result_structure(self, result: Dict) -> Dict:
         """Ensure all required fields are present with proper structure"""
-        if not isinstance(result, dict):
-            raise ValueError("Result is not a dictionary")
-        
-        # Ensure all required fields are present with proper structure
-        if 'differentiators' not in result:
-            result['differentiators'] = []
-        if 'nickname' not in result:
-            result['nickname'] = 'Anonymous Pro'
-        if 'summary' not in result:
-            result['summary'] = 'Professional with relevant experience'
-        if 'reservations' not in result:
-            result['reservations'] = ['Manual review needed']
-        if 'relevant_achievements' not in result:
-            result['relevant_achievements'] = []
-        if 'wildcard' not in result or not isinstance(result['wildcard'], dict):
-            result['wildcard'] = {"fact": "Unique profile details pending analysis", "evidence": ""}
-        if 'experience_distribution' not in result:
-            result['experience_distribution'] = {"corporate": 0, "startup": 0, "nonprofit": 0, "government": 0, "education": 0, "other": 0}
-        if 'work_history' not in result:
-            result['work_history'] = []
-        
-        # Validate structure of complex fields
-        if not isinstance(result['differentiators'], list):
-            result['differentiators'] = []
-        
-        if not isinstance(result['relevant_achievements'], list):
-            result['relevant_achievements'] = []
-        
-        if not isinstance(result['reservations'], list):
-            result['reservations'] = ['Manual review needed']
-        
-        if not isinstance(result['work_history'], list):
-            result['work_history'] = []
-        
-        return result
+        return ResumeAnalysis.from_dict(result).to_dict()
     
-    def _scrub_personal_identifiers(self, result: Dict, resume_data: Dict) -> Dict:
+    def _scrub_personal_identifiers(self, analysis: ResumeAnalysis, resume_data: Dict) -> ResumeAnalysis:
         """Remove personal identifiers (names, gender pronouns) from LLM response to ensure anonymity"""
-        # Extract candidate name from filename or resume data
-        candidate_names = self._extract_candidate_names(resume_data)
-        
-        # Fields to scrub
-        text_fields = ['summary', 'nickname']
-        
-        # Scrub main text fields
-        for field in text_fields:
-            if field in result and isinstance(result[field], str):
-                result[field] = self._scrub_text(result[field], candidate_names)
-        
-        # Scrub differentiators
-        if 'differentiators' in result and isinstance(result['differentiators'], list):
-            for diff in result['differentiators']:
-                if isinstance(diff, dict):
-                    if 'claim' in diff:
-                        diff['claim'] = self._scrub_text(diff['claim'], candidate_names)
-                    if 'evidence' in diff:
-                        diff['evidence'] = self._scrub_text(diff['evidence'], candidate_names)
-        
-        # Scrub achievements
-        if 'relevant_achievements' in result and isinstance(result['relevant_achievements'], list):
-            for achievement in result['relevant_achievements']:
-                if isinstance(achievement, dict):
-                    if 'achievement' in achievement:
-                        achievement['achievement'] = self._scrub_text(achievement['achievement'], candidate_names)
-                    if 'evidence' in achievement:
-                        achievement['evidence'] = self._scrub_text(achievement['evidence'], candidate_names)
-        
-        # Scrub wildcard
-        if 'wildcard' in result and isinstance(result['wildcard'], dict):
-            if 'fact' in result['wildcard']:
-                result['wildcard']['fact'] = self._scrub_text(result['wildcard']['fact'], candidate_names)
-            if 'evidence' in result['wildcard']:
-                result['wildcard']['evidence'] = self._scrub_text(result['wildcard']['evidence'], candidate_names)
+        name_pattern = self._name_patterns(resume_data)[1]
+        
+        # Field types are already normalized, so each list and dict is visited directly
+        if isinstance(analysis.summary, str):
+            analysis.summary = self._scrub_text(analysis.summary, name_pattern)
+        if isinstance(analysis.nickname, str):
+            analysis.nickname = self._scrub_text(analysis.nickname, name_pattern)
+        
+        for diff in analysis.differentiators:
+            if isinstance(diff, dict):
+                self._scrub_fields(diff, ('claim', 'evidence'), name_pattern)
+        
+        for achievement in analysis.relevant_achievements:
+            if isinstance(achievement, dict):
+                self._scrub_fields(achievement, ('achievement', 'evidence'), name_pattern)
+        
+        self._scrub_fields(analysis.wildcard, ('fact', 'evidence'), name_pattern)
         
         # Scrub reservations (might contain names in comparative statements)
-        if 'reservations' in result and isinstance(result['reservations'], list):
-            for i, reservation in enumerate(result['reservations']):
-                if isinstance(reservation, str):
-                    result['reservations'][i] = self._scrub_text(reservation, candidate_names)
+        reservations = analysis.reservations
+        for i, reservation in enumerate(reservations):
+            if isinstance(reservation, str):
+                reservations[i] = self._scrub_text(reservation, name_pattern)
         
-        return result
+        return analysis
+    
+    def _scrub_fields(self, item: Dict, keys, name_pattern: Optional['re.Pattern']):
+        """Scrub the given keys of one nested result object in place"""
+        for key in keys:
+            if key in item:
+                item[key] = self._scrub_text(item[key], name_pattern)
     
-    def _extract_candidate_names(self, resume_data: Dict) -> List[str]:
-        """Extract potential candidate names from filename and resume data"""
+    def _extract_candidate_names(self, resume_data: Dict, include_header_lines: bool = True) -> List[str]:
+        """Extract potential candidate names from filename and resume data, and optionally
+        from capitalized 2-3 word lines at the top of the resume"""
         names = []
         
         # Extract from filename if available (via resume_data structure)
         if 'filename' in resume_data:
             # Use the same flexible name extraction logic as ResumeParser
             filename = resume_data['filename']
-            name_without_ext = re.sub(r'\.[^.]+$', '', filename)  # Remove extension
+            name_without_ext = FILE_EXTENSION_RE.sub('', filename)  # Remove extension
             
             # Split by spaces, underscores, or other common separators
-            parts = re.split(r'[_\s]+', name_without_ext)
+            parts = FILENAME_SEPARATOR_RE.split(name_without_ext)
             parts = [part.strip() for part in parts if part.strip()]
             
             if len(parts) >= 2:
@@ -571,70 +1259,78 @@ class BatchProcessor:
             names.append(candidate_name)
         
         # Extract common names from the beginning of resume text
-        resume_text = resume_data.get('text', '')
+        resume_text = resume_data.get('text', '') if include_header_lines else ''
         if resume_text:
             # Look for name patterns at the beginning of the resume
-            lines = resume_text.split('\n')[:5]  # First 5 lines
+            lines = resume_text.split('\n', 5)[:5]  # First 5 lines
             for line in lines:
                 line = line.strip()
                 # Skip email, phone, address patterns
-                if any(pattern in line.lower() for pattern in ['@', 'phone', 'email', 'address', 'www', 'linkedin']):
+                if CONTACT_LINE_RE.search(line):
                     continue
                 # Look for potential names (2-3 words, capitalized, not too long)
-                words = line.split()
-                if 2 <= len(words) <= 3 and all(word.istitle() and word.isalpha() for word in words):
-                    names.extend(words)
+                if line.isascii():
+                    is_name = NAME_LINE_RE.fullmatch(line) is not None
+                else:
+                    # Accented names need str's Unicode-aware case checks
+                    words = line.split()
+                    is_name = 2 <= len(words) <= 3 and all(word.istitle() and word.isalpha() for word in words)
+                if is_name:
+                    names.extend(line.split())
                     names.append(line)
         
-        # Clean up and deduplicate
-        cleaned_names = []
-        for name in names:
-            # Skip single characters, common words, etc.
-            if len(name) > 1 and name.isalpha() and name not in ['Resume', 'CV', 'The', 'And', 'Or']:
-                cleaned_names.append(name)
-        
-        return list(set(cleaned_names))  # Remove duplicates
+        # Clean up and deduplicate, keeping first-seen order;
+        # skip single characters, common words, etc.
+        return list(dict.fromkeys(
+            name for name in names
+            if len(name) > 1 and name.isalpha() and name not in NAME_STOPWORDS
+        ))
     
-    def _scrub_text(self, text: str, candidate_names: List[str]) -> str:
-        """Scrub names and gender pronouns from a text string"""
+    def _compile_name_pattern(self, candidate_names: List[str]) -> Optional['re.Pattern']:
+        """One case-insensitive pattern matching any candidate name, so the text is scanned once"""
+        # Only redact names longer than 2 characters; longest first so a full name
+        # is replaced as a whole rather than word by word
+        names = sorted({name for name in candidate_names if len(name) > 2}, key=len, reverse=True)
+        if not names:
+            return None
+        return re.compile(r'\b(?:' + '|'.join(map(re.escape, names)) + r')\b', re.IGNORECASE)
+    
+    def _scrub_text(self, text: str, name_pattern: Optional['re.Pattern'] = None) -> str:
+        """Scrub names, gender pronouns and [CANDIDATE] markers from a text string"""
         if not text:
             return text
         
-        scrubbed = text
+        # Remove candidate names (case insensitive), replacing standalone mentions
+        if name_pattern is not None:
+            text = name_pattern.sub('[CANDIDATE]', text)
         
-        # Remove candidate names (case insensitive)
-        for name in candidate_names:
-            if len(name) > 2:  # Only scrub names longer than 2 characters
-                # Replace standalone name mentions
-                pattern = r'\b' + re.escape(name) + r'\b'
-                scrubbed = re.sub(pattern, '[CANDIDATE]', scrubbed, flags=re.IGNORECASE)
+        if not SCRUBBABLE_RE.search(text):
+            # Nothing to rewrite: skip the individual passes
+            return text.strip()
         
-        # Remove gender pronouns and replace with neutral alternatives
-        gender_replacements = {
-            r'\bhe\b': 'they',
-            r'\bhim\b': 'them', 
-            r'\bhis\b': 'their',
-            r'\bshe\b': 'they',
-            r'\bher\b': 'their',
-            r'\bhers\b': 'theirs',
-            r'\bHe\b': 'They',
-            r'\bHim\b': 'Them',
-            r'\bHis\b': 'Their', 
-            r'\bShe\b': 'They',
-            r'\bHer\b': 'Their',
-            r'\bHers\b': 'Theirs'
-        }
+        scrubbed = text
         
-        for pattern, replacement in gender_replacements.items():
-            scrubbed = re.sub(pattern, replacement, scrubbed)
+        # Remove gender pronouns and replace with neutral alternatives
+        scrubbed = GENDER_PRONOUN_RE.sub(_neutral_pronoun, scrubbed)
         
         # Clean up any leftover [CANDIDATE] references that start sentences awkwardly
-        scrubbed = re.sub(r'\[CANDIDATE\]\s+is\s+', 'This candidate is ', scrubbed, flags=re.IGNORECASE)
-        scrubbed = re.sub(r'\[CANDIDATE\]\s+has\s+', 'This candidate has ', scrubbed, flags=re.IGNORECASE)
-        scrubbed = re.sub(r'\[CANDIDATE\]\s+', 'The candidate ', scrubbed, flags=re.IGNORECASE)
+        if '[' in scrubbed:
+            scrubbed = CANDIDATE_MARKER_RE.sub(_candidate_phrase, scrubbed)
         
         return scrubbed.strip()
     
+    def _keyword_sentences(self, candidates: List[tuple], keywords, limit: int) -> List[str]:
+        """First sentence mentioning each keyword, in keyword order, stopping after limit hits"""
+        found = []
+        for keyword in keywords:
+            for line, lowered in candidates:
+                if keyword in lowered:
+                    found.append(line[:100])
+                    break
+            if len(found) == limit:
+                break
+        return found
+    
     def _parse_fallback_response(self, response: str) -> Dict:
         """Parse non-JSON response as fallback with smart text extraction"""
         # Try to extract useful information from the text response
@@ -646,8 +1342,7 @@ class BatchProcessor:
         # Extract summary-like content (first few sentences)
         if response and len(response.strip()) > 0:
             # Remove any markdown artifacts
-            clean_text = re.sub(r'```\w*|```', '', response)
-            clean_text = re.sub(r'^json\s*', '', clean_text, flags=re.IGNORECASE)
+            clean_text = clean_llm_json(response)
             
             # Split into sentences and take first few
             sentences = [s.strip() for s in clean_text.split('.') if s.strip()]
@@ -669,37 +1364,19 @@ class BatchProcessor:
             else:
                 summary = response[:200].strip() + "..."
             
-            # Look for potential concerns/reservations in the text
-            concern_keywords = ['concern', 'gap', 'lack', 'missing', 'weakness', 'limitation', 'however', 'but']
-            text_lower = response.lower()
-            
-            found_concerns = []
-            for keyword in concern_keywords:
-                if keyword in text_lower:
-                    # Try to extract the sentence containing the concern
-                    lines = response.split('.')
-                    for line in lines:
-                        if keyword in line.lower() and len(line.strip()) > 10:
-                            found_concerns.append(line.strip()[:100])
-                            break
+            # Split the raw reply into sentences once for both keyword searches
+            lines = [line.strip() for line in response.split('.')]
+            candidates = [(line, line.lower()) for line in lines if len(line) > 10]
             
+            # Look for potential concerns/reservations in the text
+            found_concerns = self._keyword_sentences(candidates, CONCERN_KEYWORDS, 2)
             if found_concerns:
-                reservations = found_concerns[:2]  # Take up to 2 concerns
+                reservations = found_concerns  # Take up to 2 concerns
             
             # Look for achievements or accomplishments
-            achievement_keywords = ['achievement', 'accomplished', 'led', 'managed', 'increased', 'improved', 'built', 'created']
-            found_achievements = []
-            
-            for keyword in achievement_keywords:
-                if keyword in text_lower:
-                    lines = response.split('.')
-                    for line in lines:
-                        if keyword in line.lower() and len(line.strip()) > 10:
-                            found_achievements.append(line.strip()[:100])
-                            break
-            
+            found_achievements = self._keyword_sentences(candidates, ACHIEVEMENT_KEYWORDS, 3)
             if found_achievements:
-                achievements = found_achievements[:3]  # Take up to 3 achievements
+                achievements = found_achievements  # Take up to 3 achievements
         
         return {
             "nickname": "Review Pending",
@@ -738,92 +1415,320 @@ class BatchProcessor:
             ]
         }
     
-    def process_batch(self, resumes_data: List[Dict], customization_settings: Dict, batch_size: int = 3) -> Dict[str, Dict]:
-        """Process resumes in batches"""
+    def _map_batch_response(self, batch: List[Dict], response: str) -> Dict[str, Dict]:
+        """Map a batch response back to candidate IDs; raises json.JSONDecodeError/ValueError if unusable"""
+        batch_results = self._parse_json_response(response)
+        
+        # Ensure it's an array for batch processing
+        if not isinstance(batch_results, list):
+            raise ValueError("Batch response must be an array")
+        
+        # Elements that aren't analyses are left out, so those resumes get reprocessed individually
+        return {
+            resume_data['id']: self._normalize_batch_result(result)
+            for resume_data, result in zip(batch, batch_results)
+            if isinstance(result, dict) and REQUIRED_SUMMARY_KEYS.issubset(result)
+        }
+    
+    def _normalize_batch_result(self, result) -> Dict:
+        """Validate one element of a batch reply, dropping any candidate_id the model echoed back"""
+        fixed = self._validate_and_fix_result_structure(result)
+        fixed.pop('candidate_id', None)
+        return fixed
+    
+    def _process_chunk(self, batch: List[Dict], customization_settings: Dict, timeout: Optional[float] = None) -> Dict[str, Dict]:
+        """Process one chunk of resumes with a single LLM call, falling back to per-resume calls"""
+        started = time.perf_counter()
+        results = self._process_chunk_once(batch, customization_settings, timeout)
+        self.batch_sizer.record(time.perf_counter() - started, len(batch))
+        return results
+    
+    def _process_chunk_once(self, batch: List[Dict], customization_settings: Dict, timeout: Optional[float] = None) -> Dict[str, Dict]:
+        if len(batch) == 1:
+            # Single resume - process directly
+            return {batch[0]['id']: self.process_single_resume(batch[0], customization_settings, timeout)}
+        
         results = {}
+        try:
+            batch_prompt = self.create_batch_prompt(batch, customization_settings)
+            results = self._stream_batch(batch, batch_prompt, timeout)
+        except TimeoutError:
+            raise
+        except Exception as e:
+            logger.error("Batch processing error: %s", e)
+        
+        # Only the resumes the batch reply didn't cover are reprocessed individually
+        missing = [resume_data for resume_data in batch if resume_data['id'] not in results]
+        if missing and results:
+            logger.info("Reprocessing %s of %s resumes individually", len(missing), len(batch))
+        for resume_data in missing:
+            results[resume_data['id']] = self.process_single_resume(resume_data, customization_settings, timeout)
+        return results
+    
+    async def _process_chunk_async(self, batch: List[Dict], customization_settings: Dict, timeout: Optional[float] = None) -> Dict[str, Dict]:
+        """Async counterpart of _process_chunk"""
+        started = time.perf_counter()
+        results = await self._process_chunk_once_async(batch, customization_settings, timeout)
+        self.batch_sizer.record(time.perf_counter() - started, len(batch))
+        return results
+    
+    async def _process_chunk_once_async(self, batch: List[Dict], customization_settings: Dict, timeout: Optional[float] = None) -> Dict[str, Dict]:
+        if len(batch) == 1:
+            return {batch[0]['id']: await self.process_single_resume_async(batch[0], customization_settings, timeout)}
         
-        # Process in smaller batches to avoid token limits
-        for i in range(0, len(resumes_data), batch_size):
-            batch = resumes_data[i:i + batch_size]
+        results = {}
+        try:
+            batch_prompt = self.create_batch_prompt(batch, customization_settings)
+            results = await self._stream_batch_async(batch, batch_prompt, timeout)
+        except TimeoutError:
+            raise
+        except Exception as e:
+            logger.error("Batch processing error: %s", e)
+        
+        missing = [resume_data for resume_data in batch if resume_data['id'] not in results]
+        if missing and results:
+            logger.info("Reprocessing %s of %s resumes individually", len(missing), len(batch))
+        for resume_data in missing:
+            results[resume_data['id']] = await self.process_single_resume_async(resume_data, customization_settings, timeout)
+        return results
+    
+    def _process_chunk_checkpointed(self, batch: List[Dict], customization_settings: Dict, timeout: Optional[float] = None) -> Dict[str, Dict]:
+        """Process one chunk and persist its results straight away, so a restart skips it via the cache"""
+        chunk_results = self._process_chunk(batch, customization_settings, timeout)
+        self._cache_results(batch, customization_settings.get('job_description', ''), chunk_results)
+        return chunk_results
+    
+    def _split_cached(self, resumes_data: List[Dict], job_description: str):
+        """Return cached results by candidate ID, the resumes that still need the LLM, and
+        duplicates among those (representative ID -> IDs of identical resumes)"""
+        cached = {}
+        pending = []
+        duplicates = {}
+        representatives = {}
+        for resume_data in resumes_data:
+            result = self.cache.get(resume_data['text'], job_description)
+            if result is not None:
+                cached[resume_data['id']] = result
+                continue
             
-            if len(batch) == 1:
-                # Single resume - process directly
-                result = self.process_single_resume(batch[0], customization_settings)
-                results[batch[0]['id']] = result
+            # Identical resumes in one run are analyzed once and the result copied
+            representative = representatives.setdefault(AnalysisCache.normalize(resume_data['text']), resume_data['id'])
+            if representative == resume_data['id']:
+                pending.append(resume_data)
             else:
-                # Batch processing
-                try:
-                    batch_prompt = self.create_batch_prompt(batch, customization_settings)
-                    response = self.llm_service.chat(batch_prompt)
-                    
-                    # Parse batch response using enhanced parsing
-                    try:
-                        batch_results = self._parse_json_response(response)
-                        
-                        # Ensure it's an array for batch processing
-                        if not isinstance(batch_results, list):
-                            raise ValueError("Batch response must be an array")
-                        
-                        # Map results back to candidate IDs
-                        for j, result in enumerate(batch_results):
-                            if j < len(batch):
-                                candidate_id = batch[j]['id']
-                                # Remove candidate_id from result if it exists
-                                if 'candidate_id' in result:
-                                    del result['candidate_id']
-                                # Validate and fix structure
-                                result = self._validate_and_fix_result_structure(result)
-                                results[candidate_id] = result
-                    except (json.JSONDecodeError, ValueError) as e:
-                        print(f"Batch JSON parsing failed: {e}")
-                        print(f"Raw batch response preview: {response[:300]}...")
-                        # Fallback to individual processing
-                        for resume_data in batch:
-                            result = self.process_single_resume(resume_data, customization_settings)
-                            results[resume_data['id']] = result
-                except Exception as e:
-                    print(f"Batch processing error: {e}")
-                    # Fallback to individual processing
-                    for resume_data in batch:
-                        result = self.process_single_resume(resume_data, customization_settings)
-                        results[resume_data['id']] = result
+                duplicates.setdefault(representative, []).append(resume_data['id'])
         
-        return results
+        if cached:
+            logger.info("♻️ Reusing cached analysis for %s of %s resumes", len(cached), len(resumes_data))
+        if duplicates:
+            logger.info("♻️ Analyzing %s duplicate resumes only once", sum(len(ids) for ids in duplicates.values()))
+        return cached, pending, duplicates
+    
+    def _duplicate_results(self, duplicates: Dict[str, List[str]], results: Dict[str, Dict]) -> Dict[str, Dict]:
+        """Copies of each representative's result for the identical resumes it stands for"""
+        copies = {}
+        for representative, candidate_ids in duplicates.items():
+            if representative in results:
+                for candidate_id in candidate_ids:
+                    copies[candidate_id] = copy.deepcopy(results[representative])
+        return copies
+    
+    def _cache_results(self, resumes_data: List[Dict], job_description: str, results: Dict[str, Dict]):
+        """Remember successful analyses so identical resumes skip the LLM next time"""
+        for resume_data in resumes_data:
+            result = results.get(resume_data['id'])
+            if self._is_cacheable(result):
+                self.cache.put(resume_data['text'], job_description, result)
+        self.cache.save()
     
-    async def process_batch_async(self, resumes_data: List[Dict], customization_settings: Dict) -> Dict[str, Dict]:
-        """Process resumes asynchronously"""
-        loop = asyncio.get_event_loop()
+    def _is_cacheable(self, result: Optional[Dict]) -> bool:
+        """Only real analyses are cached, never error or formatting-failure placeholders"""
+        return is_valid_analysis(result)
+    
+    def process_batch(self, resumes_data: List[Dict], customization_settings: Dict, batch_size: Optional[int] = None, timeout: Optional[float] = None) -> Dict[str, Dict]:
+        """Process resumes in batches; timeout (seconds) applies to each LLM request.
         
-        # Split into smaller batches for parallel processing
-        batch_size = 2  # Smaller batches for better parallelization
-        batches = [resumes_data[i:i + batch_size] for i in range(0, len(resumes_data), batch_size)]
+        batch_size defaults to the size the latency controller currently favours. If some
+        chunks time out, raises BatchTimeoutError carrying every other chunk's results.
+        """
+        batch_size = batch_size or self.batch_sizer.current
         
-        # Process batches concurrently
-        tasks = []
-        for batch in batches:
-            task = loop.run_in_executor(self.executor, self.process_batch, batch, customization_settings, len(batch))
-            tasks.append(task)
+        job_description = customization_settings.get('job_description', '')
+        results, pending, duplicates = self._split_cached(resumes_data, job_description)
+        
+        # Process in smaller batches to avoid token limits
+        batches = self._pack_batches(pending, batch_size)
+        
+        fresh_results = {}
+        timed_out_ids = []
+        error = None
+        if batches:
+            # Submit the other batches before working on the first one here, so every
+            # LLM call overlaps and the calling thread counts as one more worker
+            futures = [
+                self.executor.submit(self._process_chunk_checkpointed, batch, customization_settings, timeout)
+                for batch in batches[1:]
+            ]
+            
+            # Every chunk is awaited even when another fails, and a timed-out chunk
+            # only costs its own resumes
+            for batch, future in zip(batches, [None] + futures):
+                try:
+                    if future is None:
+                        chunk_results = self._process_chunk_checkpointed(batch, customization_settings, timeout)
+                    else:
+                        chunk_results = future.result()
+                except TimeoutError:
+                    timed_out_ids.extend(resume_data['id'] for resume_data in batch)
+                    continue
+                except Exception as e:
+                    error = error or e
+                    continue
+                fresh_results.update(chunk_results)
+        
+        if error is not None:
+            raise error
+        
+        results.update(fresh_results)
+        results.update(self._duplicate_results(duplicates, fresh_results))
+        if timed_out_ids:
+            timed_out_ids += [duplicate for candidate_id in timed_out_ids for duplicate in duplicates.get(candidate_id, [])]
+            raise BatchTimeoutError(
+                f"{len(timed_out_ids)} of {len(resumes_data)} resumes timed out", results, timed_out_ids
+            )
+        return results
+    
+    def process_batch_offline(self, resumes_data: List[Dict], customization_settings: Dict,
+                              cancel: Optional[threading.Event] = None) -> Dict[str, Dict]:
+        """Analyze resumes through the provider's bulk API: cheaper, but may take hours to return.
+        If cancel is set while waiting, resumes left without a reply are omitted from the results"""
+        job_description = customization_settings.get('job_description', '')
+        results, pending, duplicates = self._split_cached(resumes_data, job_description)
+        if not pending:
+            return results
+        
+        # One request per resume so replies map back 1:1 by candidate ID
+        prompts = {}
+        for resume_data in pending:
+            if '_last_response' in resume_data:
+                prompts[resume_data['id']] = self._build_enhanced_formatting_prompt(resume_data, customization_settings)
+            else:
+                prompts[resume_data['id']] = self._build_single_prompt(resume_data, customization_settings)
         
-        # Wait for all batches to complete
-        batch_results = await asyncio.gather(*tasks)
+        logger.info("📦 Submitting %s resumes to the offline batch API", len(prompts))
+        replies = self.llm_service.chat_batch(prompts, cancel)
+        cancelled = cancel is not None and cancel.is_set()
         
-        # Combine results
-        combined_results = {}
-        for batch_result in batch_results:
-            combined_results.update(batch_result)
+        fresh_results = {}
+        for resume_data in pending:
+            candidate_id = resume_data['id']
+            response = replies.get(candidate_id)
+            
+            if response is None and cancelled:
+                continue
+            if response is None:
+                logger.error("LLM API error processing resume for %s: no reply in offline batch", resume_data['name'])
+                fresh_results[candidate_id] = self._create_error_response()
+                continue
+            
+            try:
+                if '_last_response' in resume_data:
+                    fresh_results[candidate_id] = self._finalize_enhanced_response(resume_data, response)
+                else:
+                    fresh_results[candidate_id] = self._finalize_single_response(resume_data, response)
+            except json.JSONDecodeError as e:
+                logger.warning("JSON parsing failed for %s: %s", resume_data.get('name', 'unknown'), e)
+                fresh_results[candidate_id] = self._json_failure_response(resume_data, response, e)
+            except Exception as e:
+                logger.error("Error processing offline reply for %s: %s", resume_data.get('name', 'unknown'), e)
+                fresh_results[candidate_id] = self._create_error_response()
+        
+        self._cache_results(pending, job_description, fresh_results)
+        results.update(fresh_results)
+        results.update(self._duplicate_results(duplicates, fresh_results))
+        return results
+    
+    async def process_stream(self, resumes_data: List[Dict], customization_settings: Dict, batch_size: Optional[int] = None, timeout: Optional[float] = None):
+        """Yield (candidate_id, result) as each chunk finishes, keeping up to max_in_flight chunks in flight"""
+        job_description = customization_settings.get('job_description', '')
+        cached, pending, duplicates = self._split_cached(resumes_data, job_description)
+        for candidate_id, result in cached.items():
+            yield candidate_id, result
+        if not pending:
+            return
+        
+        if len(self._pack_batches(pending, batch_size or self.batch_sizer.current)) == 1:
+            # One chunk: no point spinning up queues and workers
+            chunk_results = await self._process_chunk_async(pending, customization_settings, timeout)
+            self._cache_results(pending, job_description, chunk_results)
+            chunk_results.update(self._duplicate_results(duplicates, chunk_results))
+            for candidate_id, result in chunk_results.items():
+                yield candidate_id, result
+            return
+        
+        # Workers share one event loop, so a plain deque needs no locking
+        queue = deque(pending)
+        finished = asyncio.Queue()
+        
+        async def worker():
+            # Each worker pulls its next chunk as soon as its last one finishes,
+            # so one slow response never holds up the rest of the run
+            while queue:
+                # Without a fixed batch_size each chunk picks up the controller's latest size
+                chunk_size = batch_size or self.batch_sizer.current
+                batch = [queue.popleft()]
+                batch_tokens = self._resume_tokens(batch[0], BATCH_RESUME_TOKENS)
+                while queue and len(batch) < chunk_size:
+                    next_tokens = self._resume_tokens(queue[0], BATCH_RESUME_TOKENS)
+                    if batch_tokens + next_tokens > BATCH_PROMPT_TOKEN_BUDGET:
+                        break
+                    batch.append(queue.popleft())
+                    batch_tokens += next_tokens
+                try:
+                    chunk_results = await self._process_chunk_async(batch, customization_settings, timeout)
+                except Exception as e:
+                    await finished.put((batch, e))
+                    return
+                await finished.put((batch, chunk_results))
         
-        return combined_results
+        worker_count = min(self.max_in_flight, -(-len(pending) // (batch_size or self.batch_sizer.current)))
+        workers = [asyncio.ensure_future(worker()) for _ in range(worker_count)]
+        remaining = len(pending)
+        try:
+            while remaining:
+                batch, chunk_results = await finished.get()
+                if isinstance(chunk_results, Exception):
+                    raise chunk_results
+                remaining -= len(batch)
+                
+                # Checkpoint every chunk so an interrupted run only redoes unfinished chunks
+                await asyncio.to_thread(self._cache_results, batch, job_description, chunk_results)
+                chunk_results.update(self._duplicate_results(duplicates, chunk_results))
+                for candidate_id, result in chunk_results.items():
+                    yield candidate_id, result
+        finally:
+            for task in workers:
+                task.cancel()
+            self.cache.save()
+    
+    async def process_batch_async(self, resumes_data: List[Dict], customization_settings: Dict, batch_size: Optional[int] = None, timeout: Optional[float] = None) -> Dict[str, Dict]:
+        """Process resumes concurrently on the event loop and return all results at once"""
+        results = {}
+        async for candidate_id, result in self.process_stream(resumes_data, customization_settings, batch_size, timeout):
+            results[candidate_id] = result
+        return results
     
     def close(self):
         """Clean up resources"""
-        self.executor.shutdown(wait=True) 
+        if self.owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=True)
 
     def _assess_response_quality(self, result: Dict, resume_data: Dict, raw_response: str) -> Dict:
         """Assess if the parsed response contains meaningful content vs fallback data"""
         quality_issues = []
         
         # Check for generic/fallback content
-        if result.get('nickname') in ['Anonymous Pro', 'Review Pending', 'Processing Error']:
+        if result.get('nickname') in GENERIC_NICKNAMES:
             quality_issues.append('Generic nickname')
         
         if result.get('summary', '').startswith('Professional candidate requiring manual review'):
@@ -843,12 +1748,12 @@ class BatchProcessor:
         elif isinstance(achievements, list) and len(achievements) > 0:
             if isinstance(achievements[0], str):
                 # String format (fallback)
-                if any(phrase in str(achievements[0]).lower() for phrase in ['manual review', 'error', 'unable']):
+                if FALLBACK_PHRASE_RE.search(achievements[0]):
                     quality_issues.append('Fallback achievement content')
             elif isinstance(achievements[0], dict):
                 # Proper dict format - check for meaningful content
                 first_achievement = achievements[0].get('achievement', '')
-                if any(phrase in first_achievement.lower() for phrase in ['error', 'unable', 'manual review']):
+                if FALLBACK_PHRASE_RE.search(first_achievement):
                     quality_issues.append('Generic achievement content')
         
         # Check work history
@@ -856,10 +1761,7 @@ class BatchProcessor:
         if not work_history or len(work_history) == 0:
             # This could be legitimate if the resume has no work history
             # But let's check if the resume actually contains work experience
-            resume_text = resume_data.get('text', '').lower()
-            work_indicators = ['experience', 'employment', 'work', 'position', 'job', 'company', 'corp', 'inc', 'llc']
-            
-            if any(indicator in resume_text for indicator in work_indicators):
+            if WORK_INDICATOR_RE.search(resume_data.get('text', '')):
                 quality_issues.append('No work history extracted despite resume containing work experience')
         
         # Check if response is too short relative to resume content
@@ -871,7 +1773,7 @@ class BatchProcessor:
         
         # Check for obvious parsing artifacts
         summary = result.get('summary', '')
-        if any(artifact in summary.lower() for artifact in ['```', 'json', 'markdown', '```json']):
+        if FORMATTING_ARTIFACT_RE.search(summary):
             quality_issues.append('Response contains formatting artifacts')
         
         is_low_quality = len(quality_issues) >= 2  # Threshold: 2+ quality issues
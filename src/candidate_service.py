@@ -1,8 +1,40 @@
 import os
 import json
+import tempfile
 from datetime import datetime
 from typing import List, Dict, Optional
 
+try:
+    # orjson reads and writes the (multi-megabyte) summaries cache several times faster
+    import orjson
+    _json_loads = orjson.loads
+
+    def _json_dumps(data) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(data) -> bytes:
+        return json.dumps(data, indent=2).encode('utf-8')
+
+def _atomic_write(path, data: bytes):
+    """Write to a temp file and rename it over path, so a crash mid-write keeps the previous file.
+    Each write gets its own temp file, so concurrent writers never interleave into one"""
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.',
+                                     suffix='.tmp', delete=False) as f:
+        try:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, path)
+
+# Each decision kind maps candidate id -> timestamp
+DECISION_KINDS = {'save': 'saved', 'pass': 'passed', 'star': 'starred'}
+
 class CandidateService:
     def __init__(self, llm_service, resume_parser, customization_service):
         self.llm_service = llm_service
@@ -12,7 +44,9 @@ class CandidateService:
         self.data_folder = 'data'
         self.decisions_file = os.path.join(self.data_folder, 'decisions.json')
         self.summaries_cache = os.path.join(self.data_folder, 'summaries_cache.json')
-        self.decision_history_file = os.path.join(self.data_folder, 'decision_history.json')
+        self.decision_history_file = os.path.join(self.data_folder, 'decision_history.jsonl')
+        self.legacy_decision_history_file = os.path.join(self.data_folder, 'decision_history.json')
+        self._resumes_cache = None   # (folder mtime, resume list, {id: resume})
         self._load_data()
         self.swipe_history = []
         
@@ -29,45 +63,91 @@ class CandidateService:
         """Load existing decisions and summaries from files"""
         # Load decisions
         if os.path.exists(self.decisions_file):
-            with open(self.decisions_file, 'r') as f:
-                self.decisions = json.load(f)
+            with open(self.decisions_file, 'rb') as f:
+                self.decisions = _json_loads(f.read())
         else:
-            self.decisions = {'saved': [], 'passed': [], 'starred': [], 'custom_order': []}
+            self.decisions = {'saved': {}, 'passed': {}, 'starred': {}, 'custom_order': []}
         
         # Ensure custom_order exists
         if 'custom_order' not in self.decisions:
             self.decisions['custom_order'] = []
         
-        # Load decision history
+        # Older files stored each kind as a list of {id, timestamp} entries
+        for kind in DECISION_KINDS.values():
+            entries = self.decisions.get(kind, {})
+            if isinstance(entries, list):
+                entries = {item['id']: item.get('timestamp') for item in entries}
+            self.decisions[kind] = entries
+        self._saved_order = None
+        
+        # Load decision history: an append-only log with one JSON entry per line
         if os.path.exists(self.decision_history_file):
             with open(self.decision_history_file, 'r') as f:
+                self.decision_history = [json.loads(line) for line in f if line.strip()]
+            self.history_saved = len(self.decision_history)
+        elif os.path.exists(self.legacy_decision_history_file):
+            # Older versions rewrote the whole history as one JSON array; it moves into the log on the next save
+            with open(self.legacy_decision_history_file, 'r') as f:
                 self.decision_history = json.load(f)
+            self.history_saved = 0
         else:
             self.decision_history = []
+            self.history_saved = 0
         
         # Load summaries cache
         if os.path.exists(self.summaries_cache):
-            with open(self.summaries_cache, 'r') as f:
-                self.summaries = json.load(f)
+            with open(self.summaries_cache, 'rb') as f:
+                self.summaries = _json_loads(f.read())
         else:
             self.summaries = {}
+        
+        # Summaries saved before job hashes were recorded were always cleared on a
+        # job description change, so they belong to the current one
+        job_hash = self.customization_service.get_job_hash()
+        for summary_data in self.summaries.values():
+            summary_data.setdefault('job_hash', job_hash)
     
     def _save_data(self):
         """Save decisions, summaries, and history to files"""
+        self._save_decisions()
+        self._save_summaries()
+    
+    def _save_decisions(self):
+        """Save decisions and append new history entries; swipes don't touch the summaries file"""
+        self._saved_order = None   # Every decision change is persisted through here
         os.makedirs(self.data_folder, exist_ok=True)
         
-        with open(self.decisions_file, 'w') as f:
-            json.dump(self.decisions, f, indent=2)
+        _atomic_write(self.decisions_file, _json_dumps(self.decisions))
         
-        with open(self.decision_history_file, 'w') as f:
-            json.dump(self.decision_history, f, indent=2)
+        new_entries = self.decision_history[self.history_saved:]
+        if new_entries:
+            with open(self.decision_history_file, 'a') as f:
+                f.write(''.join(json.dumps(entry) + '\n' for entry in new_entries))
+            self.history_saved = len(self.decision_history)
+    
+    def _save_summaries(self):
+        """Save the summaries cache"""
+        os.makedirs(self.data_folder, exist_ok=True)
         
-        with open(self.summaries_cache, 'w') as f:
-            json.dump(self.summaries, f, indent=2)
+        _atomic_write(self.summaries_cache, _json_dumps(self.summaries))
+
+    def _get_resumes(self):
+        """Resume list and {id: resume} index, re-scanned only when the candidates folder changes"""
+        try:
+            mtime = os.stat(self.candidates_folder).st_mtime_ns
+        except OSError:
+            return [], {}
+        
+        cached = self._resumes_cache
+        if cached is None or cached[0] != mtime:
+            resumes = self.resume_parser.get_all_resumes(self.candidates_folder)
+            cached = self._resumes_cache = (mtime, resumes, {resume['id']: resume for resume in resumes})
+        return cached[1], cached[2]
 
     def get_all_candidates(self, include_processing=True):
         """Get all candidates with enhanced real-time processing status"""
-        resumes = self.resume_parser.get_all_resumes(self.candidates_folder)
+        resumes, _ = self._get_resumes()
+        job_hash = self.customization_service.get_job_hash()
         candidates = []
         
         # Update processing stats
@@ -89,6 +169,7 @@ class CandidateService:
                     'filename': resume['filename'],
                     'processing_status': 'completed',
                     'ready_for_review': True,
+                    'stale': summary_data.get('job_hash') != job_hash,
                     **summary_data
                 }
                 candidates.append(candidate)
@@ -125,12 +206,16 @@ class CandidateService:
         """Get candidates currently being processed"""
         return [c for c in self.get_all_candidates() if c.get('processing_status') == 'processing']
 
+    def is_summary_stale(self, candidate_id):
+        """True if the cached summary was written for a different job description"""
+        summary_data = self.summaries.get(candidate_id)
+        if summary_data is None:
+            return False
+        return summary_data.get('job_hash') != self.customization_service.get_job_hash()
+
     def _is_candidate_decided(self, candidate_id):
         """Check if candidate has already been decided on"""
-        saved_ids = [item['id'] for item in self.decisions['saved']]
-        passed_ids = [item['id'] for item in self.decisions['passed']]
-        starred_ids = [item['id'] for item in self.decisions.get('starred', [])]
-        return candidate_id in saved_ids or candidate_id in passed_ids or candidate_id in starred_ids
+        return any(candidate_id in self.decisions[kind] for kind in DECISION_KINDS.values())
 
     def _update_processing_stats(self, resumes):
         """Update processing statistics"""
@@ -162,8 +247,7 @@ class CandidateService:
                 summary_data = self.summaries[candidate_id]
                 
                 # Find the resume info
-                resumes = self.resume_parser.get_all_resumes(self.candidates_folder)
-                resume = next((r for r in resumes if r['id'] == candidate_id), None)
+                resume = self._get_resumes()[1].get(candidate_id)
                 
                 if resume:
                     candidate = {
@@ -181,39 +265,38 @@ class CandidateService:
 
     def get_candidate(self, candidate_id):
         """Get a specific candidate by ID with enhanced processing status"""
-        resumes = self.resume_parser.get_all_resumes(self.candidates_folder)
-        
-        for resume in resumes:
-            if resume['id'] == candidate_id:
-                if candidate_id in self.summaries:
-                    summary_data = self.summaries[candidate_id]
-                    return {
-                        'id': candidate_id,
-                        'name': summary_data.get('nickname', 'Anonymous Pro'),
-                        'filename': resume['filename'],
-                        'processing_status': 'completed',
-                        'ready_for_review': True,
-                        **summary_data
-                    }
-                else:
-                    # Return processing placeholder
-                    return {
-                        'id': candidate_id,
-                        'name': 'Processing...',
-                        'nickname': 'Processing...',
-                        'filename': resume['filename'],
-                        'summary': 'This candidate is currently being processed...',
-                        'processing_status': 'processing',
-                        'ready_for_review': False,
-                        'differentiators': [],
-                        'reservations': ['Processing in progress...'],
-                        'relevant_achievements': [],
-                        'wildcard': {'fact': 'Processing...', 'evidence': ''},
-                        'work_history': [],
-                        'experience_distribution': {"corporate": 0, "startup": 0, "nonprofit": 0, "government": 0, "education": 0, "other": 0}
-                    }
+        resume = self._get_resumes()[1].get(candidate_id)
+        if resume is None:
+            return None
         
-        return None
+        if candidate_id in self.summaries:
+            summary_data = self.summaries[candidate_id]
+            return {
+                'id': candidate_id,
+                'name': summary_data.get('nickname', 'Anonymous Pro'),
+                'filename': resume['filename'],
+                'processing_status': 'completed',
+                'ready_for_review': True,
+                'stale': self.is_summary_stale(candidate_id),
+                **summary_data
+            }
+        else:
+            # Return processing placeholder
+            return {
+                'id': candidate_id,
+                'name': 'Processing...',
+                'nickname': 'Processing...',
+                'filename': resume['filename'],
+                'summary': 'This candidate is currently being processed...',
+                'processing_status': 'processing',
+                'ready_for_review': False,
+                'differentiators': [],
+                'reservations': ['Processing in progress...'],
+                'relevant_achievements': [],
+                'wildcard': {'fact': 'Processing...', 'evidence': ''},
+                'work_history': [],
+                'experience_distribution': {"corporate": 0, "startup": 0, "nonprofit": 0, "government": 0, "education": 0, "other": 0}
+            }
 
     def save_decision(self, candidate_id, decision):
         """Save swipe decision with enhanced tracking"""
@@ -224,33 +307,10 @@ class CandidateService:
         
         timestamp = datetime.now().isoformat()
         
-        # Ensure all decision types exist
-        if 'starred' not in self.decisions:
-            self.decisions['starred'] = []
-        
-        # Check if already in saved/passed/starred lists
-        saved_ids = [item['id'] for item in self.decisions['saved']]
-        passed_ids = [item['id'] for item in self.decisions['passed']]
-        starred_ids = [item['id'] for item in self.decisions['starred']]
-        
-        if decision == 'save':
-            if candidate_id not in saved_ids:
-                self.decisions['saved'].append({
-                    'id': candidate_id,
-                    'timestamp': timestamp
-                })
-        elif decision == 'pass':
-            if candidate_id not in passed_ids:
-                self.decisions['passed'].append({
-                    'id': candidate_id,
-                    'timestamp': timestamp
-                })
-        elif decision == 'star':
-            if candidate_id not in starred_ids:
-                self.decisions['starred'].append({
-                    'id': candidate_id,
-                    'timestamp': timestamp
-                })
+        # Keep the original timestamp if the candidate is already in that list
+        kind = DECISION_KINDS.get(decision)
+        if kind:
+            self.decisions[kind].setdefault(candidate_id, timestamp)
         
         self.swipe_history.append({'candidate_id': candidate_id, 'decision': decision})
         
@@ -263,52 +323,46 @@ class CandidateService:
             'action': 'initial_swipe'
         })
         
-        self._save_data()
+        self._save_decisions()
         return {'success': True, 'decision': decision}
 
+    def _get_saved_order(self):
+        """Saved and starred ids in display order, recomputed only after decisions change"""
+        if self._saved_order is None:
+            saved = self.decisions['saved']
+            starred = self.decisions['starred']
+            
+            # Start with custom ordered candidates (if they're saved or starred), then the rest
+            ordered_ids = dict.fromkeys(
+                candidate_id for candidate_id in self.decisions.get('custom_order', [])
+                if candidate_id in saved or candidate_id in starred
+            )
+            ordered_ids.update(dict.fromkeys(saved))
+            ordered_ids.update(dict.fromkeys(starred))
+            self._saved_order = list(ordered_ids)
+        return self._saved_order
+
     def get_saved_candidates(self):
         """Get all saved candidates with enhanced information (includes both saved and starred)"""
         saved_candidates = []
+        saved = self.decisions['saved']
+        starred = self.decisions['starred']
+        resumes_by_id = self._get_resumes()[1]
         
-        # Get both saved and starred candidates
-        saved_ids = [item['id'] for item in self.decisions['saved']]
-        starred_ids = [item['id'] for item in self.decisions.get('starred', [])]
-        all_saved_or_starred_ids = list(set(saved_ids + starred_ids))  # Remove duplicates
-        
-        custom_order = self.decisions.get('custom_order', [])
-        
-        # Start with custom ordered candidates (if they're saved or starred)
-        ordered_ids = []
-        for candidate_id in custom_order:
-            if candidate_id in all_saved_or_starred_ids:
-                ordered_ids.append(candidate_id)
-        
-        # Add any saved/starred candidates not in custom order
-        for candidate_id in all_saved_or_starred_ids:
-            if candidate_id not in ordered_ids:
-                ordered_ids.append(candidate_id)
-        
-        for candidate_id in ordered_ids:
+        for candidate_id in self._get_saved_order():
             if candidate_id in self.summaries:
                 summary_data = self.summaries[candidate_id]
                 
                 # Find the resume info
-                resumes = self.resume_parser.get_all_resumes(self.candidates_folder)
-                resume = next((r for r in resumes if r['id'] == candidate_id), None)
+                resume = resumes_by_id.get(candidate_id)
                 
                 if resume:
                     # Check status: saved, starred, or both
-                    is_saved = candidate_id in saved_ids
-                    is_starred = candidate_id in starred_ids
+                    is_saved = candidate_id in saved
+                    is_starred = candidate_id in starred
                     
                     # Add saved timestamp
-                    saved_at = None
-                    if is_saved:
-                        saved_item = next((item for item in self.decisions['saved'] if item['id'] == candidate_id), None)
-                        saved_at = saved_item['timestamp'] if saved_item else None
-                    elif is_starred:
-                        starred_item = next((item for item in self.decisions.get('starred', []) if item['id'] == candidate_id), None)
-                        saved_at = starred_item['timestamp'] if starred_item else None
+                    saved_at = saved[candidate_id] if is_saved else starred.get(candidate_id)
                     
                     candidate = {
                         'id': candidate_id,
@@ -326,21 +380,18 @@ class CandidateService:
     def update_candidate_order(self, ordered_ids):
         """Update the custom order of saved candidates"""
         self.decisions['custom_order'] = ordered_ids
-        self._save_data()
+        self._save_decisions()
         return {'success': True}
 
     def get_passed_candidates(self):
         """Get all passed candidates"""
         passed_candidates = []
-        passed_ids = [item['id'] for item in self.decisions['passed']]
-        
-        for candidate_id in passed_ids:
+        for candidate_id in self.decisions['passed']:
             if candidate_id in self.summaries:
                 summary_data = self.summaries[candidate_id]
                 
                 # Find the resume info
-                resumes = self.resume_parser.get_all_resumes(self.candidates_folder)
-                resume = next((r for r in resumes if r['id'] == candidate_id), None)
+                resume = self._get_resumes()[1].get(candidate_id)
                 
                 if resume:
                     candidate = {
@@ -358,45 +409,21 @@ class CandidateService:
         timestamp = datetime.now().isoformat()
         
         # Find current decision
-        current_decision = None
-        saved_ids = [item['id'] for item in self.decisions['saved']]
-        passed_ids = [item['id'] for item in self.decisions['passed']]
-        starred_ids = [item['id'] for item in self.decisions.get('starred', [])]
-        
-        if candidate_id in saved_ids:
-            current_decision = 'save'
-        elif candidate_id in passed_ids:
-            current_decision = 'pass'
-        elif candidate_id in starred_ids:
-            current_decision = 'star'
+        current_decision = next(
+            (decision for decision, kind in DECISION_KINDS.items() if candidate_id in self.decisions[kind]), None
+        )
         
         if current_decision == new_decision:
             return {'success': True, 'message': 'No change needed'}
         
         # Remove from current lists
-        self.decisions['saved'] = [d for d in self.decisions['saved'] if d.get('id') != candidate_id]
-        self.decisions['passed'] = [d for d in self.decisions['passed'] if d.get('id') != candidate_id]
-        if 'starred' in self.decisions:
-            self.decisions['starred'] = [d for d in self.decisions['starred'] if d.get('id') != candidate_id]
+        for kind in DECISION_KINDS.values():
+            self.decisions[kind].pop(candidate_id, None)
         
         # Add to new list if not 'unreviewed'
-        if new_decision == 'save':
-            self.decisions['saved'].append({
-                'id': candidate_id,
-                'timestamp': timestamp
-            })
-        elif new_decision == 'pass':
-            self.decisions['passed'].append({
-                'id': candidate_id,
-                'timestamp': timestamp
-            })
-        elif new_decision == 'star':
-            if 'starred' not in self.decisions:
-                self.decisions['starred'] = []
-            self.decisions['starred'].append({
-                'id': candidate_id,
-                'timestamp': timestamp
-            })
+        kind = DECISION_KINDS.get(new_decision)
+        if kind:
+            self.decisions[kind][candidate_id] = timestamp
         
         # Record decision change in history
         self.decision_history.append({
@@ -407,7 +434,7 @@ class CandidateService:
             'action': 'decision_modified'
         })
         
-        self._save_data()
+        self._save_decisions()
         return {'success': True, 'old_decision': current_decision, 'new_decision': new_decision}
 
     def undo_last_swipe(self):
@@ -419,20 +446,16 @@ class CandidateService:
         candidate_id = last_swipe['candidate_id']
         decision = last_swipe['decision']
 
-        if decision == 'save':
-            self.decisions['saved'] = [d for d in self.decisions['saved'] if d.get('id') != candidate_id]
-        elif decision == 'pass':
-            self.decisions['passed'] = [d for d in self.decisions['passed'] if d.get('id') != candidate_id]
-        elif decision == 'star':
-            if 'starred' in self.decisions:
-                self.decisions['starred'] = [d for d in self.decisions['starred'] if d.get('id') != candidate_id]
+        kind = DECISION_KINDS.get(decision)
+        if kind:
+            self.decisions[kind].pop(candidate_id, None)
 
-        self._save_data()
+        self._save_decisions()
         return {'success': True, 'undone_candidate_id': candidate_id}
 
     def restart_session(self):
         """Clear all decisions and start over"""
-        self.decisions = {'saved': [], 'passed': [], 'starred': [], 'custom_order': []}
+        self.decisions = {'saved': {}, 'passed': {}, 'starred': {}, 'custom_order': []}
         self.swipe_history = []
-        self._save_data()
+        self._save_decisions()
         return {'success': True} 
\ No newline at end of file
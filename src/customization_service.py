@@ -1,11 +1,13 @@
 import os
 import json
+import hashlib
 
 class CustomizationService:
     def __init__(self, data_folder='data'):
         self.data_folder = data_folder
         self.settings_file = os.path.join(self.data_folder, 'customization_settings.json')
         self.settings = self._load_settings()
+        self._job_hash = None
 
     def _load_settings(self):
         """Load customization settings from a file."""
@@ -26,8 +28,21 @@ class CustomizationService:
         """Get the current customization settings."""
         return self.settings
 
+    @staticmethod
+    def hash_job_description(job_description):
+        """Short content hash of a job description, ignoring whitespace-only edits"""
+        normalized = ' '.join(job_description.split())
+        return hashlib.blake2b(normalized.encode('utf-8', 'surrogatepass'), digest_size=8).hexdigest()
+
+    def get_job_hash(self):
+        """Hash of the current job description, used to spot summaries written for an older one"""
+        if self._job_hash is None:
+            self._job_hash = self.hash_job_description(self.settings.get('job_description', ''))
+        return self._job_hash
+
     def update_settings(self, job_description):
         """Update and save the customization settings."""
         self.settings['job_description'] = job_description
+        self._job_hash = None
         self._save_settings()
         return {'success': True} 
\ No newline at end of file
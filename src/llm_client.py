@@ -1,6 +1,60 @@
 import abc
+import asyncio
+import logging
+import threading
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
 
 class BaseLLMClient(abc.ABC):
     @abc.abstractmethod
     def chat(self, prompt: str, **kwargs) -> str:
-        pass 
\ No newline at end of file
+        """Send a prompt and return the reply text.
+
+        Implementations should honour a ``timeout`` kwarg (seconds) by aborting
+        the underlying request and raising the builtin ``TimeoutError``.
+        """
+        pass
+
+    async def achat(self, prompt: str, **kwargs) -> str:
+        """Async variant of chat; clients without a native async API run chat in a worker thread.
+
+        Native implementations should reuse one long-lived, pooled HTTP client
+        rather than opening a connection per request.
+        """
+        return await asyncio.to_thread(self.chat, prompt, **kwargs)
+
+    def chat_stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """Yield the reply text in pieces as it is generated; same timeout contract as chat.
+
+        Clients without a streaming API yield the whole reply at once.
+        """
+        yield self.chat(prompt, **kwargs)
+
+    async def achat_stream(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """Async variant of chat_stream; by default yields the whole achat reply at once"""
+        yield await self.achat(prompt, **kwargs)
+
+    def close(self):
+        """Release pooled connections; the default client holds none"""
+        pass
+
+    async def aclose(self):
+        """Async variant of close, for clients whose async connection pool must be closed on its event loop"""
+        self.close()
+
+    def chat_batch(self, prompts: Dict[str, str], cancel: Optional[threading.Event] = None) -> Dict[str, str]:
+        """Answer many prompts keyed by an ID; IDs whose request failed are left out.
+
+        Providers with a bulk/offline API can override this; the default sends
+        the prompts one by one. Once cancel is set, the replies so far are returned.
+        """
+        replies = {}
+        for custom_id, prompt in prompts.items():
+            if cancel is not None and cancel.is_set():
+                break
+            try:
+                replies[custom_id] = self.chat(prompt)
+            except Exception as e:
+                logger.warning("Batch request %s failed: %s", custom_id, e)
+        return replies
\ No newline at end of file
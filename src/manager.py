@@ -1,8 +1,28 @@
+import threading
+from typing import AsyncIterator, Dict, Iterator, Optional
 from .llm_client import BaseLLMClient
 
 class LLMService:
     def __init__(self, client: BaseLLMClient):
         self.client = client
 
-    def chat(self, prompt: str) -> str:
-        return self.client.chat(prompt) 
\ No newline at end of file
+    def chat(self, prompt: str, **kwargs) -> str:
+        return self.client.chat(prompt, **kwargs)
+
+    async def achat(self, prompt: str, **kwargs) -> str:
+        return await self.client.achat(prompt, **kwargs)
+
+    def chat_stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        return self.client.chat_stream(prompt, **kwargs)
+
+    def achat_stream(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        return self.client.achat_stream(prompt, **kwargs)
+
+    def chat_batch(self, prompts: Dict[str, str], cancel: Optional[threading.Event] = None) -> Dict[str, str]:
+        return self.client.chat_batch(prompts, cancel)
+
+    def close(self):
+        self.client.close()
+
+    async def aclose(self):
+        await self.client.aclose()
\ No newline at end of file
@@ -1,19 +1,210 @@
 import os
+import json
+import time
+import asyncio
+import logging
+import weakref
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, APITimeoutError
 from .llm_client import BaseLLMClient
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
+try:
+    import h2  # noqa: F401 - enables HTTP/2 multiplexing in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Reasoning models reject max_tokens and take max_completion_tokens instead
+REASONING_MODEL_PREFIXES = ("o1", "o3", "o4", "gpt-5")
+
+def is_reasoning_model(model_name):
+    """True for models that think before answering (o-series, gpt-5): slower, and their
+    hidden reasoning counts against the output token cap"""
+    name = model_name.lower().rsplit("/", 1)[-1]
+    return name.startswith(REASONING_MODEL_PREFIXES) or "reasoning" in name
+
+# (model prefix, max output tokens, context window), most specific prefix first
+MODEL_TOKEN_LIMITS = (
+    ("gpt-4o-mini", 16384, 128000),
+    ("gpt-4o", 16384, 128000),
+    ("gpt-4.1", 32768, 1047576),
+    ("gpt-4-turbo", 4096, 128000),
+    ("gpt-4-32k", 8192, 32768),
+    ("gpt-4", 8192, 8192),
+    ("gpt-3.5-turbo", 4096, 16385),
+    ("gpt-5", 128000, 400000),
+    ("o1", 100000, 200000),
+    ("o3", 100000, 200000),
+    ("o4", 100000, 200000),
+)
+DEFAULT_TOKEN_LIMITS = (4096, None)
+CHARS_PER_PROMPT_TOKEN = 3  # conservative, so the clamp errs toward fitting the context
+
+def model_token_limits(model_name):
+    """(max output tokens, context window or None) for a model name"""
+    name = model_name.lower().rsplit("/", 1)[-1]
+    for prefix, max_output, context in MODEL_TOKEN_LIMITS:
+        if name.startswith(prefix):
+            return max_output, context
+    return DEFAULT_TOKEN_LIMITS
+
+# Connections kept open to the API so concurrent requests skip the TCP/TLS handshake
+MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", 100))
+
 class OpenAIAdapter(BaseLLMClient):
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self._limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+        self.client = OpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=httpx.Client(limits=self._limits, http2=HTTP2_AVAILABLE)
+        )
+        # An async pool's connections belong to the event loop that opened them, so each loop
+        # (e.g. each asyncio.run) gets its own client, dropped along with the loop
+        self._async_clients = weakref.WeakKeyDictionary()
         self.model = os.getenv("OPENAI_DEFAULT_MODEL", "gpt-4")
 
+    @property
+    def async_client(self):
+        """The async client for the running event loop, created on first use in that loop"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                http_client=httpx.AsyncClient(limits=self._limits, http2=HTTP2_AVAILABLE)
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def _completion_kwargs(self, prompt, kwargs):
+        """Request options with the output cap clamped to what the model allows, under the
+        parameter name it accepts"""
+        if "max_tokens" not in kwargs:
+            return kwargs
+        kwargs = dict(kwargs)
+        max_output, context = model_token_limits(self.model)
+        cap = min(kwargs.pop("max_tokens"), max_output)
+        if context:
+            cap = min(cap, context - -(-len(prompt) // CHARS_PER_PROMPT_TOKEN))
+        if cap <= 0:
+            # Prompt alone fills the context; let the API report it rather than send a bad cap
+            return kwargs
+        kwargs["max_completion_tokens" if is_reasoning_model(self.model) else "max_tokens"] = cap
+        return kwargs
+
     def chat(self, prompt, **kwargs):
-        resp = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-            **kwargs
+        try:
+            resp = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                **self._completion_kwargs(prompt, kwargs)
+            )
+        except APITimeoutError as e:
+            # The HTTP request has been aborted; surface it as a plain timeout
+            raise TimeoutError(str(e)) from e
+        return resp.choices[0].message.content
+
+    async def achat(self, prompt, **kwargs):
+        try:
+            resp = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                **self._completion_kwargs(prompt, kwargs)
+            )
+        except APITimeoutError as e:
+            raise TimeoutError(str(e)) from e
+        return resp.choices[0].message.content
+
+    def chat_stream(self, prompt, **kwargs):
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+                **self._completion_kwargs(prompt, kwargs)
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except APITimeoutError as e:
+            raise TimeoutError(str(e)) from e
+
+    async def achat_stream(self, prompt, **kwargs):
+        try:
+            stream = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+                **self._completion_kwargs(prompt, kwargs)
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except APITimeoutError as e:
+            raise TimeoutError(str(e)) from e
+
+    def close(self):
+        self.client.close()
+        # Async pools can only be closed on their own loop (see aclose); the rest are dropped
+        self._async_clients.clear()
+
+    async def aclose(self):
+        self.client.close()
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+        self._async_clients.clear()
+
+    def chat_batch(self, prompts, cancel=None, poll_interval=30):
+        """Run prompts through the Batch API: half the token price, up to 24h turnaround.
+        Setting cancel cancels the job at the next poll and returns no replies"""
+        lines = [
+            json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {"model": self.model, "messages": [{"role": "user", "content": prompt}]},
+            })
+            for custom_id, prompt in prompts.items()
+        ]
+        input_file = self.client.files.create(
+            file=("batch_input.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
         )
-        return resp.choices[0].message.content 
\ No newline at end of file
+
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            if cancel is None:
+                time.sleep(poll_interval)
+            elif cancel.wait(poll_interval):
+                self.client.batches.cancel(batch.id)
+                logger.info("Cancelled batch job %s", batch.id)
+                return {}
+            batch = self.client.batches.retrieve(batch.id)
+
+        replies = {}
+        if batch.output_file_id:
+            for line in self.client.files.content(batch.output_file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                record = _json_loads(line)
+                response = record.get("response") or {}
+                if response.get("status_code") == 200:
+                    replies[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+                else:
+                    logger.warning("Batch request %s failed: %s", record["custom_id"], record.get("error") or response.get("status_code"))
+        return replies
\ No newline at end of file
@@ -0,0 +1,57 @@
+from typing import Dict, List, Optional
+
+
+def _empty_experience_distribution() -> Dict[str, int]:
+    return {"corporate": 0, "startup": 0, "nonprofit": 0, "government": 0, "education": 0, "other": 0}
+
+
+class ResumeAnalysis:
+    """Normalized LLM analysis of one resume, with defaults for anything the model left out"""
+
+    FIELDS = (
+        'nickname', 'summary', 'differentiators', 'reservations', 'relevant_achievements',
+        'wildcard', 'experience_distribution', 'work_history',
+    )
+    __slots__ = FIELDS + ('extras',)
+
+    def __init__(self, nickname: str = 'Anonymous Pro',
+                 summary: str = 'Professional with relevant experience',
+                 differentiators: Optional[List] = None,
+                 reservations: Optional[List] = None,
+                 relevant_achievements: Optional[List] = None,
+                 wildcard: Optional[Dict] = None,
+                 experience_distribution: Optional[Dict] = None,
+                 work_history: Optional[List] = None,
+                 extras: Optional[Dict] = None):
+        self.nickname = nickname
+        self.summary = summary
+        self.differentiators = differentiators if isinstance(differentiators, list) else []
+        self.reservations = reservations if isinstance(reservations, list) else ['Manual review needed']
+        self.relevant_achievements = relevant_achievements if isinstance(relevant_achievements, list) else []
+        self.wildcard = wildcard if isinstance(wildcard, dict) else {"fact": "Unique profile details pending analysis", "evidence": ""}
+        self.experience_distribution = experience_distribution if experience_distribution is not None else _empty_experience_distribution()
+        self.work_history = work_history if isinstance(work_history, list) else []
+        # Keys the model returned beyond the known fields are carried through untouched
+        self.extras = extras or {}
+
+    @classmethod
+    def from_dict(cls, result: Dict) -> 'ResumeAnalysis':
+        """Build from a parsed LLM response; raises ValueError if it isn't a JSON object"""
+        if not isinstance(result, dict):
+            raise ValueError("Result is not a dictionary")
+
+        known = {}
+        extras = {}
+        for key, value in result.items():
+            if key in cls.FIELDS:
+                known[key] = value
+            else:
+                extras[key] = value
+        return cls(extras=extras, **known)
+
+    def to_dict(self) -> Dict:
+        """Plain dict for storage and templates"""
+        data = dict(self.extras)
+        for key in self.FIELDS:
+            data[key] = getattr(self, key)
+        return data
@@ -12,10 +12,7 @@ class ResumeParser:
         """Extract text from PDF file"""
         try:
             reader = PdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text.strip()
+            return "\n".join(page.extract_text() for page in reader.pages).strip()
         except Exception as e:
             print(f"Error reading PDF {file_path}: {e}")
             return ""
@@ -24,10 +21,7 @@ class ResumeParser:
         """Extract text from DOCX file"""
         try:
             doc = Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text.strip()
+            return "\n".join(paragraph.text for paragraph in doc.paragraphs).strip()
         except Exception as e:
             print(f"Error reading DOCX {file_path}: {e}")
             return ""